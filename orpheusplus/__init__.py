@@ -55,6 +55,7 @@ def _check_metadata():
     global OPERATION_DIR
     global LOG_DIR
     global GROUP_DIR
+    global DIFFCACHE_DIR
 
     meta = ORPHEUSPLUS_ROOT_DIR / ".meta"
     USER_PATH = meta / "user"
@@ -62,6 +63,7 @@ def _check_metadata():
     OPERATION_DIR = meta / "operation"
     LOG_DIR = meta / "log"
     GROUP_DIR = meta / "group"
+    DIFFCACHE_DIR = meta / "diffcache"
 
     meta.mkdir(exist_ok=True, parents=True)
     USER_PATH.touch(exist_ok=True)
@@ -69,6 +71,7 @@ def _check_metadata():
     OPERATION_DIR.mkdir(exist_ok=True)
     LOG_DIR.mkdir(exist_ok=True)
     GROUP_DIR.mkdir(exist_ok=True)
+    DIFFCACHE_DIR.mkdir(exist_ok=True)
 
 
 import_check()
\ No newline at end of file
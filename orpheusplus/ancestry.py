@@ -0,0 +1,69 @@
+from collections import deque
+
+
+class AncestryIndex():
+    # Bit `a` of masks[v] is set when version `a` is `v` or one of its
+    # ancestors. Versions are numbered in commit order, so the highest common
+    # bit of two versions is a lowest common ancestor, and every query is a
+    # few big-integer operations instead of a graph traversal.
+    def __init__(self):
+        self.masks = {}
+
+    @classmethod
+    def build(cls, G):
+        index = cls()
+        for version in sorted(G.nodes):
+            index.add_version(version, G.predecessors(version))
+        return index
+
+    def add_version(self, version, parents=()):
+        mask = 1 << version
+        for parent in parents:
+            mask |= self.masks.get(parent, 0)
+        self.masks[version] = mask
+
+    def add_edge(self, parent, child):
+        # Merges only add edges into the newest version, which has no
+        # descendants to update yet
+        self.masks[child] |= self.masks[parent]
+
+    def __contains__(self, version):
+        return version in self.masks
+
+    def __len__(self):
+        return len(self.masks)
+
+    def is_ancestor(self, ancestor, version):
+        return (self.masks[version] >> ancestor) & 1 == 1
+
+    def lowest_common_ancestor(self, version_1, version_2):
+        common = self.masks[version_1] & self.masks[version_2]
+        return common.bit_length() - 1 if common else None
+
+    def ancestors(self, version):
+        mask = self.masks[version] & ~(1 << version)
+        return [ancestor for ancestor in range(mask.bit_length()) if (mask >> ancestor) & 1]
+
+    def descendants(self, version):
+        return sorted(each for each in self.masks
+                      if each != version and self.is_ancestor(version, each))
+
+    def path(self, G, ancestor, version):
+        # Shortest path from `ancestor` to `version`, only walking back
+        # through versions that descend from `ancestor`
+        children = {version: None}
+        queue = deque([version])
+        while queue:
+            current = queue.popleft()
+            if current == ancestor:
+                break
+            for parent in G.predecessors(current):
+                if parent not in children and self.is_ancestor(ancestor, parent):
+                    children[parent] = current
+                    queue.append(parent)
+        path = []
+        current = ancestor
+        while current is not None:
+            path.append(current)
+            current = children[current]
+        return path
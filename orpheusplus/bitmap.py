@@ -0,0 +1,88 @@
+import zlib
+
+
+class RidBitmap():
+    # Bit `rid` of a Python int is set for every rid in the set, so unions,
+    # intersections and differences run as native big-integer operations.
+    # Serialized bitmaps are zlib-compressed, which keeps long runs of rids
+    # and sparse sets small.
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_rids(cls, rids):
+        rids = list(rids)
+        if not rids:
+            return cls()
+        buffer = bytearray(max(rids) // 8 + 1)
+        for rid in rids:
+            buffer[rid >> 3] |= 1 << (rid & 7)
+        return cls(int.from_bytes(buffer, "little"))
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        # The bits are set in one buffer and converted once, as OR-ing a
+        # big int per interval copies the whole bitmap each time
+        intervals = list(intervals)
+        if not intervals:
+            return cls()
+        buffer = bytearray(max(end for _, end in intervals) // 8 + 1)
+        for start, end in intervals:
+            first, last = start >> 3, end >> 3
+            start_mask = (0xFF << (start & 7)) & 0xFF
+            end_mask = 0xFF >> (7 - (end & 7))
+            if first == last:
+                buffer[first] |= start_mask & end_mask
+                continue
+            buffer[first] |= start_mask
+            buffer[first + 1:last] = b"\xff" * (last - first - 1)
+            buffer[last] |= end_mask
+        return cls(int.from_bytes(buffer, "little"))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        if not blob:
+            return cls()
+        return cls(int.from_bytes(zlib.decompress(blob), "little"))
+
+    def to_bytes(self):
+        raw = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        return zlib.compress(raw)
+
+    def intervals(self):
+        # Runs of set bits as inclusive (start_rid, end_rid) intervals
+        bits = format(self.bits, "b")[::-1]
+        intervals = []
+        start = bits.find("1")
+        while start != -1:
+            end = bits.find("0", start)
+            if end == -1:
+                end = len(bits)
+            intervals.append((start, end - 1))
+            start = bits.find("1", end)
+        return intervals
+
+    def __iter__(self):
+        for start, end in self.intervals():
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, rid):
+        return (self.bits >> rid) & 1 == 1
+
+    def __eq__(self, other):
+        return isinstance(other, RidBitmap) and self.bits == other.bits
+
+    def __or__(self, other):
+        return RidBitmap(self.bits | other.bits)
+
+    def __and__(self, other):
+        return RidBitmap(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return RidBitmap(self.bits & ~other.bits)
@@ -3,6 +3,9 @@ import sys
 from pathlib import Path
 from orpheusplus.connection import connect_table
 from orpheusplus.exceptions import MySQLError
+from orpheusplus.partition import DEFAULT_PARTITION_DELTA
+from orpheusplus.version_data import CSV_CHUNK_SIZE
+from orpheusplus.version_table import DEFAULT_STORAGE, STORAGE_MODELS
 
 
 def main():
@@ -31,6 +34,8 @@ def setup_argparsers():
     init_parser.add_argument("-n", "--name", required=True, help="version table name")
     init_parser.add_argument("-s", "--structure", help="table structure")
     init_parser.add_argument("-t", "--table", help="table name for an existing table")
+    init_parser.add_argument("--storage", choices=list(STORAGE_MODELS), default=DEFAULT_STORAGE,
+                             help="how versions are stored")
     init_parser.set_defaults(func=init_table)
 
     ls_parser = subparsers.add_parser("ls", help="List all tables under version control")
@@ -46,6 +51,9 @@ def setup_argparsers():
     diff_parser = subparsers.add_parser("diff", help="Show the difference between two versions")
     diff_parser.add_argument("-n", "--name", required=True, help="table name")
     diff_parser.add_argument("-v",  "--version", nargs=2, help="version numbers or `head`")
+    diff_parser.add_argument("--stat", action="store_true", help="only count the differing rows")
+    diff_parser.add_argument("-u", "--updates", action="store_true",
+                             help="pair the rows updated between the versions")
     diff_parser.set_defaults(func=diff)
 
     drop_parser = subparsers.add_parser("drop", help="Drop a version table")
@@ -77,6 +85,8 @@ def setup_argparsers():
     checkout_parser.add_argument("-n", "--name", help="table name")
     checkout_parser.add_argument("-g", "--group", help="group name")
     checkout_parser.add_argument("-v", "--version", required=True, help="version number or `head`")
+    checkout_parser.add_argument("--mode", choices=["auto", "full", "delta"], default="auto",
+                                 help="rebuild the head table or apply only the changed rows")
     checkout_parser.set_defaults(func=checkout)
 
     commit_parser = subparsers.add_parser("commit", help="Create a new version")
@@ -90,22 +100,45 @@ def setup_argparsers():
     merge_parser.add_argument("-v", "--version", required=True, type=int,
                               help="the version to be merged into the current version")
     merge_parser.add_argument("-r", "--resolved", help="path to resolved conflict file")
+    merge_parser.add_argument("-c", "--by-column", action="store_true",
+                              help="auto-resolve rows whose versions changed different columns")
     merge_parser.set_defaults(func=merge)
 
+    ancestry_parser = subparsers.add_parser("ancestry", help="Show the ancestors and descendants of versions")
+    ancestry_parser.add_argument("-n", "--name", required=True, help="table name")
+    ancestry_parser.add_argument("-v", "--version", nargs="+", required=True,
+                                 help="a version, or two versions to find their common ancestor")
+    ancestry_parser.set_defaults(func=ancestry)
+
+    repartition_parser = subparsers.add_parser("repartition", help="Partition the data table by version")
+    repartition_parser.add_argument("-n", "--name", required=True, help="table name")
+    repartition_parser.add_argument("-d", "--delta", type=float, default=DEFAULT_PARTITION_DELTA,
+                                    help="0 to 1, higher for faster checkout and more duplicated rows")
+    repartition_parser.add_argument("--off", action="store_true", help="drop all partitions")
+    repartition_parser.set_defaults(func=repartition)
+
     insert_parser = subparsers.add_parser("insert", help="Insert data from file")
     insert_parser.add_argument("-n", "--name", required=True, help="table name")
     insert_parser.add_argument("-d", "--data", required=True)
+    insert_parser.add_argument("--chunk-size", type=int, default=CSV_CHUNK_SIZE,
+                               help="rows applied at a time")
+    insert_parser.add_argument("--bulk", action="store_true",
+                               help="load with LOAD DATA LOCAL INFILE if the server allows it")
     insert_parser.set_defaults(func=manipulate, op="insert")
 
     delete_parser = subparsers.add_parser("delete", help="Delete data from file")
     delete_parser.add_argument("-n", "--name", required=True, help="table name")
     delete_parser.add_argument("-d", "--data", required=True)
+    delete_parser.add_argument("--chunk-size", type=int, default=CSV_CHUNK_SIZE,
+                               help="rows applied at a time")
     delete_parser.set_defaults(func=manipulate, op="delete")
 
     update_parser = subparsers.add_parser("update", help="Update data from file")
     update_parser.add_argument("-n", "--name", required=True, help="table name")
     update_parser.add_argument("-d", "--data", required=True, nargs=2,
                                help="OLD_DATA NEW_DATA")
+    update_parser.add_argument("--chunk-size", type=int, default=CSV_CHUNK_SIZE,
+                               help="rows applied at a time")
     update_parser.set_defaults(func=manipulate, op="update")
 
     run_parser = subparsers.add_parser("run", help="Run a SQL script")
@@ -283,25 +316,48 @@ def diff(args):
     table.load_table(args["name"])
     version_1 = _handle_version_arg(args["version"][0], table)
     version_2 = _handle_version_arg(args["version"][1], table)
-    diff_result = table.diff(version_1, version_2)
     print(f"Diff version {version_1} and version {version_2}:")
-    print(f"In version {version_1} only: {len(diff_result['v1_diff_v2'])} rows")
-    _print_result(diff_result["v1_diff_v2"], diff_result["fields"])
-    print(f"In version {version_2} only: {len(diff_result['v2_diff_v1'])} rows")
-    _print_result(diff_result["v2_diff_v1"], diff_result["fields"])
+    if args["stat"]:
+        num_1, num_2 = table.diff_stat(version_1, version_2)
+        print(f"In version {version_1} only: {num_1} rows")
+        print(f"In version {version_2} only: {num_2} rows")
+        return
+    if args["updates"]:
+        diff_result = table.diff_updates(version_1, version_2)
+        print(f"Updated from version {version_1} to version {version_2}:")
+        num_rows = 0
+        for page in diff_result["updated"]:
+            _print_result([_highlight_update(*each) for each in page], diff_result["fields"])
+            num_rows += len(page)
+        print(f"{num_rows} rows")
+    else:
+        diff_result = table.diff(version_1, version_2)
+    for version, key in [(version_1, "v1_diff_v2"), (version_2, "v2_diff_v1")]:
+        print(f"In version {version} only:")
+        num_rows = 0
+        for page in diff_result[key]:
+            _print_result(page, diff_result["fields"])
+            num_rows += len(page)
+        print(f"{num_rows} rows")
+
+
+def _highlight_update(before, after, changed):
+    return [f"{before[idx]} -> {after[idx]}" if idx in changed else before[idx]
+            for idx in range(len(before))]
 
 
 def init_table(args):
     table = connect_table()
     if args["table"] is None:
-        table.init_table(args["name"], args["structure"])
+        table.init_table(args["name"], args["structure"], args["storage"])
         print(f"Table `{args['name']}` initialized successfully.")
     else:
         if args["name"] is None:
             print("Please specify a table name by `-n`.")
             sys.exit()
         temp_data_path = Path("./temp_data.csv")
-        table.from_table(from_table=args["table"], to_table=args["name"])
+        table.from_table(from_table=args["table"], to_table=args["name"],
+                         storage=args["storage"])
 
         args.update(input=f"SELECT * FROM {args['table']}",
                     file=None,
@@ -331,7 +387,7 @@ def checkout(args):
         table.load_table(args["name"])
         version = _handle_version_arg(args["version"], table)
         try:
-            table.checkout(version)
+            table.checkout(version, mode=args["mode"])
             print(f"Checkout to version {version}.")
         except NonEmptyOperation:
             pass
@@ -406,17 +462,53 @@ def merge(args):
     if not table.operation.is_empty():
         print("Please commit before merge.")
         sys.exit()
-    table.merge(args["version"], args["resolved"])
+    table.merge(args["version"], args["resolved"], args["by_column"])
     new_head = table.version_graph.head
     print(
         f"Merge version {head} and {args['version']} into version {new_head}."
     )
 
 
+def ancestry(args):
+    table = connect_table()
+    table.load_table(args["name"])
+    graph = table.version_graph
+    versions = [_handle_version_arg(version, table) for version in args["version"]]
+    for version in versions:
+        if not graph.G.has_node(version):
+            print(f"Version {version} doesn't exist.")
+            sys.exit()
+
+    if len(versions) == 1:
+        version = versions[0]
+        print(f"Ancestors of version {version}: {graph.get_ancestors(version)}")
+        print(f"Descendants of version {version}: {graph.get_descendants(version)}")
+    elif len(versions) == 2:
+        version_1, version_2 = versions
+        ancestor = graph.get_common_ancestor(version_1, version_2)
+        print(f"Common ancestor of version {version_1} and {version_2}: {ancestor}")
+        if ancestor in versions and version_1 != version_2:
+            descendant = version_2 if ancestor == version_1 else version_1
+            print(f"Version {ancestor} is an ancestor of version {descendant}.")
+    else:
+        print("Please specify one or two versions.")
+
+
+def repartition(args):
+    table = connect_table()
+    table.load_table(args["name"])
+    if args["off"]:
+        table.partitions.remove()
+        print(f"Remove partitions of `{args['name']}`.")
+    else:
+        table.repartition(args["delta"])
+
+
 def manipulate(args):
     table = connect_table()
     table.load_table(args["name"])
-    table.from_file(args["op"], args["data"])
+    table.from_file(args["op"], args["data"], args.get("chunk_size", CSV_CHUNK_SIZE),
+                    args.get("bulk", False))
     print(f"{str(args['op']).title()} from file {args['data']}")
 
 
@@ -529,7 +621,7 @@ def run(args):
 
     table = connect_table()
     mydb = table.cnx
-    parser = SQLParser()
+    parser = SQLParser(cnx=mydb)
     if args["file"] is not None:
         parser.parse_file(args["file"])
     elif args["input"] is not None:
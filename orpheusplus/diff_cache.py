@@ -0,0 +1,66 @@
+import os
+import pickle
+import shutil
+
+from orpheusplus import DIFFCACHE_DIR, ORPHEUSPLUS_CONFIG
+from orpheusplus.intervals import RidRanges
+
+# Bytes of cached diffs kept for all tables, set by `diff_cache_size` in
+# config.yaml
+DEFAULT_DIFF_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class DiffCache():
+    # Committed versions never change, so the rids in only one of two
+    # versions are cached as intervals in one file per pair of versions.
+    # The least recently used files are evicted once the cache is too large.
+    def __init__(self, db_name, table_name):
+        self.cache_dir = DIFFCACHE_DIR / db_name / table_name
+
+    def get(self, version_1, version_2):
+        path = self._path(version_1, version_2)
+        try:
+            with open(path, "rb") as f:
+                intervals_low, intervals_high = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # Mark as recently used
+        os.utime(path)
+        rids = (RidRanges(intervals_low), RidRanges(intervals_high))
+        return rids if version_1 <= version_2 else rids[::-1]
+
+    def put(self, version_1, version_2, rids_1, rids_2):
+        rids = (rids_1, rids_2) if version_1 <= version_2 else (rids_2, rids_1)
+        intervals = tuple(RidRanges.from_rids(each).intervals for each in rids)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(version_1, version_2)
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            pickle.dump(intervals, f)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self, max_size=None):
+        if max_size is None:
+            max_size = int(ORPHEUSPLUS_CONFIG.get("diff_cache_size", DEFAULT_DIFF_CACHE_SIZE))
+        entries = []
+        total_size = 0
+        for path in DIFFCACHE_DIR.glob("*/*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        for _, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+    def remove(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _path(self, version_1, version_2):
+        low, high = sorted((int(version_1), int(version_2)))
+        return self.cache_dir / f"{low}_{high}"
@@ -0,0 +1,121 @@
+# rid sets encoded as sorted, inclusive `(start_rid, end_rid)` intervals
+from bisect import bisect_right
+
+
+def to_intervals(rids):
+    if isinstance(rids, RidRanges):
+        return list(rids.intervals)
+    intervals = []
+    for rid in sorted(set(rids)):
+        if intervals and rid == intervals[-1][1] + 1:
+            intervals[-1][1] = rid
+        else:
+            intervals.append([rid, rid])
+    return [tuple(each) for each in intervals]
+
+
+def from_intervals(intervals):
+    for start, end in intervals:
+        yield from range(start, end + 1)
+
+
+def count_intervals(intervals):
+    return sum(end - start + 1 for start, end in intervals)
+
+
+def union_intervals(intervals_1, intervals_2):
+    merged = []
+    for start, end in sorted(list(intervals_1) + list(intervals_2)):
+        # Overlapping or adjacent intervals are coalesced
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(each) for each in merged]
+
+
+def subtract_intervals(intervals_1, intervals_2):
+    result = []
+    removes = sorted(intervals_2)
+    idx = 0
+    for start, end in sorted(intervals_1):
+        while idx < len(removes) and removes[idx][1] < start:
+            idx += 1
+        next_idx = idx
+        while next_idx < len(removes) and removes[next_idx][0] <= end:
+            remove_start, remove_end = removes[next_idx]
+            if remove_start > start:
+                result.append((start, remove_start - 1))
+            start = max(start, remove_end + 1)
+            if start > end:
+                break
+            next_idx += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+class RidCounter():
+    # Multiset of rids stored as count changes at range boundaries, so
+    # adding a range costs the same for one rid or millions of them
+    def __init__(self):
+        self.deltas = {}
+
+    def add(self, start, num, weight=1):
+        for pos, change in ((start, weight), (start + num, -weight)):
+            value = self.deltas.get(pos, 0) + change
+            if value:
+                self.deltas[pos] = value
+            else:
+                self.deltas.pop(pos, None)
+
+    def add_intervals(self, intervals, weight=1):
+        for start, end in intervals:
+            self.add(start, end - start + 1, weight)
+
+    def intervals(self, positive=True):
+        # Runs of rids counted more than 0 times (less than 0 if not `positive`)
+        result = []
+        count = 0
+        start = None
+        for pos in sorted(self.deltas):
+            count += self.deltas[pos]
+            inside = count > 0 if positive else count < 0
+            if inside and start is None:
+                start = pos
+            elif not inside and start is not None:
+                result.append((start, pos - 1))
+                start = None
+        return result
+
+
+class RidRanges():
+    # Sorted rids kept as intervals. Iterates and compares like the list of
+    # its rids.
+    def __init__(self, intervals=()):
+        self.intervals = list(intervals)
+
+    @classmethod
+    def from_rids(cls, rids):
+        return cls(to_intervals(rids))
+
+    def __iter__(self):
+        return from_intervals(self.intervals)
+
+    def __len__(self):
+        return count_intervals(self.intervals)
+
+    def __contains__(self, rid):
+        idx = bisect_right(self.intervals, (rid, float("inf"))) - 1
+        return idx >= 0 and self.intervals[idx][0] <= rid <= self.intervals[idx][1]
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __eq__(self, other):
+        if isinstance(other, RidRanges):
+            return self.intervals == other.intervals
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"RidRanges({self.intervals})"
@@ -1,12 +1,19 @@
 import re
 import sys
+import tempfile
 
 import mysql.connector
 
 from orpheusplus import ORPHEUSPLUS_CONFIG
 from orpheusplus.exceptions import MySQLError
+from orpheusplus.intervals import RidRanges, from_intervals, to_intervals
 
 ERROR_CODE_PATTERN = re.compile(r"(\d+)")
+STAGE_BATCH_SIZE = 10000
+# More runs of consecutive rids than this are staged into a temporary table
+MAX_RANGE_PREDICATES = 64
+STAGED_RIDS_TABLE = "orpheusplus_staged_rids"
+FETCH_PAGE_SIZE = 10000
 
 class MySQLManager():
     def __init__(self, user, passwd, host=None, database=None, port=None):
@@ -20,18 +27,36 @@ class MySQLManager():
     def connect_to_mysql(self, args=None):
         args = args if args is not None else self.cnx_args
         try:
-            self.cnx = mysql.connector.connect(**args)
+            # `LOAD DATA LOCAL INFILE` may only read the temporary files
+            # written for it
+            self.cnx = mysql.connector.connect(
+                allow_local_infile_in_path=tempfile.gettempdir(), **args)
             self.cursor = self.cnx.cursor()
         except mysql.connector.Error as e:
             self._handle_known_connection_error(e)
 
-    def execute(self, stmt):
+    def execute(self, stmt, params=None):
         try:
-            self.cursor.execute(stmt)
+            self.cursor.execute(stmt, params)
             return self.cursor.fetchall()
         except mysql.connector.Error as e:
             self._handle_known_programming_error(e)
 
+    def fetch_pages(self, stmt, page_size=FETCH_PAGE_SIZE):
+        # Rows of `stmt` read through an unbuffered cursor, `page_size` rows
+        # at a time. The connection can't run other statements until all
+        # pages are read.
+        cursor = self.cnx.cursor(buffered=False)
+        try:
+            cursor.execute(stmt)
+            while page := cursor.fetchmany(page_size):
+                yield page
+        except mysql.connector.Error as e:
+            self._handle_known_programming_error(e)
+        finally:
+            self.cnx.consume_results()
+            cursor.close()
+
     def executemany(self, stmt, data):
         try:
             self.cursor.executemany(stmt, data)
@@ -42,6 +67,47 @@ class MySQLManager():
     def commit(self):
         self.cnx.commit()
 
+    def stage_rids(self, table_name, rids):
+        # Load rids into a temporary table of this session so that
+        # statements can join against them
+        self.execute(f"DROP TEMPORARY TABLE IF EXISTS {table_name}")
+        self.execute(f"CREATE TEMPORARY TABLE {table_name} (rid INT UNSIGNED PRIMARY KEY)")
+        rids = [(rid, ) for rid in rids]
+        stmt = f"INSERT INTO {table_name} VALUES (%s)"
+        for idx in range(0, len(rids), STAGE_BATCH_SIZE):
+            self.executemany(stmt, rids[idx:idx + STAGE_BATCH_SIZE])
+        return table_name
+
+    def rid_condition(self, rids, column="rid", table_name=STAGED_RIDS_TABLE):
+        # SQL condition that holds for `rids` without a literal list of all
+        # of them. Call `drop_staged` once the statements using it are done.
+        intervals = to_intervals(rids)
+        if not intervals:
+            return "FALSE"
+        if len(intervals) <= MAX_RANGE_PREDICATES:
+            ranges = [f"{column} = {start}" if start == end else f"{column} BETWEEN {start} AND {end}"
+                      for start, end in intervals]
+            return f"({' OR '.join(ranges)})"
+        # Staged from the intervals, so repeated rids are staged once
+        self.stage_rids(table_name, from_intervals(intervals))
+        return f"{column} IN (SELECT rid FROM {table_name})"
+
+    def fetch_rid_ranges(self, rid_stmt):
+        # Runs of consecutive rids selected by `rid_stmt`, grouped inside
+        # MySQL so that only one row per run is fetched
+        stmt = (f"SELECT MIN(rid), MAX(rid) FROM ("
+                f"SELECT rid, CAST(rid AS SIGNED) - ROW_NUMBER() OVER (ORDER BY rid) AS run "
+                f"FROM ({rid_stmt}) AS selected) AS runs "
+                f"GROUP BY run ORDER BY MIN(rid)")
+        return RidRanges([(start, end) for start, end in self.execute(stmt)])
+
+    def local_infile_enabled(self):
+        result = self.execute("SELECT @@GLOBAL.local_infile")
+        return bool(int(result[0][0]))
+
+    def drop_staged(self, table_name=STAGED_RIDS_TABLE):
+        self.execute(f"DROP TEMPORARY TABLE IF EXISTS {table_name}")
+
     def create_database(self, db_name):
         query = f"CREATE DATABASE IF NOT EXISTS {db_name}"
         result = self.execute(query)
@@ -1,17 +1,33 @@
+import os
 import pickle
 import re
 from contextlib import contextmanager
 from datetime import datetime
 
 from orpheusplus import OPERATION_DIR
+from orpheusplus.intervals import RidCounter, RidRanges
+
+JOURNAL_SUFFIX = ".journal"
+# Number of journal records replayed on load before they are compacted
+# into the snapshot
+JOURNAL_COMPACT_RECORDS = 1000
+
 
 class Operation():
+    # The pickled operation is a snapshot. Each change is appended as a
+    # record to `{operation_path}.journal` and replayed on load, so a change
+    # doesn't rewrite the whole history.
     def __init__(self):
         self.stmts = []
-        self.add_rids = []
-        self.remove_rids = []
+        self.add_rids = RidRanges()
+        self.remove_rids = RidRanges()
+        # Parsed stmts not committed yet
         self.history = []
+        # The stmts of each child version committed from this version
+        self.segments = {}
         self.operation_path = None
+        self.snapshot_id = 0
+        self.journal_records = 0
     
     def init_operation(self, db_name, table_name, version, user=None):
         if user is None:
@@ -19,8 +35,7 @@ class Operation():
         else:
             self.operation_path = OPERATION_DIR / f"{db_name}/{table_name}/{version}_{user}"
         self.operation_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.operation_path, "wb") as f:
-            pickle.dump(self, f)
+        self.save_operation()
     
     def load_operation(self, db_name, table_name, version):
         try:
@@ -41,14 +56,97 @@ class Operation():
             
         with open(self.operation_path, "rb") as f:
             self.__dict__.update(pickle.load(f).__dict__)
+        # Operations saved before RidRanges store lists of rids
+        if isinstance(self.add_rids, list):
+            self.add_rids = RidRanges.from_rids(self.add_rids)
+            self.remove_rids = RidRanges.from_rids(self.remove_rids)
+        # Operations saved before segments keep every commit in `history`
+        if not self.segments:
+            self.segments, self.history = self._split_history(self.history)
+        self._replay_journal()
     
     def save_operation(self):
+        # Write a new snapshot and drop the journal. Records left in the
+        # journal by a crash in between belong to an older snapshot id and
+        # are skipped on load.
         try:
-            with open(self.operation_path, "wb") as f:
+            self.snapshot_id += 1
+            self.journal_records = 0
+            temp_path = self.operation_path.with_name(self.operation_path.name + ".tmp")
+            with open(temp_path, "wb") as f:
                 pickle.dump(self, f)
+            os.replace(temp_path, self.operation_path)
+            self._journal_path().unlink(missing_ok=True)
         except:
             raise Exception(f"{self.operation_path} not properly initialized.")
 
+    def _journal_path(self):
+        return self.operation_path.with_name(self.operation_path.name + JOURNAL_SUFFIX)
+
+    def _apply(self, record):
+        self._apply_record(record)
+        journal_path = self._journal_path()
+        with open(journal_path, "ab") as f:
+            # Start a new journal for the current snapshot
+            if self.journal_records == 0 or f.tell() == 0:
+                f.truncate(0)
+                pickle.dump(("snapshot", self.snapshot_id), f)
+            pickle.dump(record, f)
+        self.journal_records += 1
+        if self.journal_records >= JOURNAL_COMPACT_RECORDS:
+            self.save_operation()
+
+    def _replay_journal(self):
+        try:
+            f = open(self._journal_path(), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                if pickle.load(f) != ("snapshot", self.snapshot_id):
+                    return
+            except Exception:
+                return
+            end = f.tell()
+            while True:
+                try:
+                    record = pickle.load(f)
+                except Exception:
+                    break
+                self._apply_record(record)
+                self.journal_records += 1
+                end = f.tell()
+            truncated = f.seek(0, os.SEEK_END) > end
+        # Drop a record cut off by a crash so that new records stay readable
+        if truncated:
+            with open(self._journal_path(), "r+b") as f:
+                f.truncate(end)
+
+    def _apply_record(self, record):
+        op, args = record
+        if op == "stmts":
+            self.stmts.extend(args)
+        elif op == "update":
+            # An update replaces the delete and insert stmts it was made of
+            num_stmts, stmt = args
+            del self.stmts[len(self.stmts) - num_stmts:]
+            self.stmts.append(stmt)
+        elif op == "history":
+            self.history.extend(args)
+        elif op == "segment":
+            child, stmts = args
+            self.segments[child] = list(stmts)
+        elif op == "clear":
+            self.stmts = []
+            self.add_rids = RidRanges()
+            self.remove_rids = RidRanges()
+            if not args:
+                self.history = []
+        elif op == "parse":
+            self.add_rids, self.remove_rids = self._count_rids(self.stmts)
+            self.history.extend(self.stmts)
+            self.stmts = []
+
     @staticmethod 
     def get_user_head(db_name, table_name, user):
         op_path = list((OPERATION_DIR / db_name / table_name).glob(f"*_{user}"))
@@ -66,34 +164,36 @@ class Operation():
         except:
             return
         new_operation_path = self.operation_path.parent / f"{str(version)}_{user}"
+        # Fold the journal into the snapshot so that only one file moves
+        self.save_operation()
         self.operation_path.rename(new_operation_path)
         self.operation_path = new_operation_path
-        self.save_operation()
     
     def commit(self, child, **commit_info):
         # If commit message has more than 72 characters, truncate it.
         msg = commit_info["msg"]
         now = commit_info["now"]
         msg = msg[:72]
-        self.add_rids = []
-        self.remove_rids = []
-        self.history.append(("commit", (child, msg), now))
+        self._apply(("clear", True))
+        self._apply(("history", [("commit", (child, msg), now)]))
         
         current_version = self.operation_path.name.split("_", 1)[0]
         version_op_path = self.operation_path.parent / current_version
         table_name = self.operation_path.parent.name
         db_name = self.operation_path.parent.parent.name
-        op = Operation() 
-        if not version_op_path.is_file():
-            op.init_operation(db_name, table_name, current_version)
+        if version_op_path == self.operation_path:
+            # Merging into a version from its own operation file
+            op = self
         else:
-            op.load_operation(db_name, table_name, current_version)
-        op.history.extend(self.history)
-        op.save_operation()
+            op = Operation() 
+            if not version_op_path.is_file():
+                op.init_operation(db_name, table_name, current_version)
+            else:
+                op.load_operation(db_name, table_name, current_version)
+        op._apply(("segment", (child, self.history)))
 
         self.clear(keep_history=False)
         self.switch_user_version_head(child)
-        self.save_operation()
     
     def remove(self):
         import shutil
@@ -103,51 +203,58 @@ class Operation():
     def insert(self, rids):
         now = datetime.now()
         rids = self._parse_rids(rids)
-        for start_rid, num_rids in rids:
-            self.stmts.append(("insert", (start_rid, num_rids), now))
-        self.save_operation()
+        stmts = [("insert", (start_rid, num_rids), now) for start_rid, num_rids in rids]
+        self._apply(("stmts", stmts))
 
     def delete(self, rids):
         now = datetime.now()
         rids = self._parse_rids(rids)
-        for start_rid, num_rids in rids:
-            self.stmts.append(("delete", (start_rid, num_rids), now))
-        self.save_operation()
+        stmts = [("delete", (start_rid, num_rids), now) for start_rid, num_rids in rids]
+        self._apply(("stmts", stmts))
     
     def update(self, delete_list, insert_list):
-        insert_stmt = self.stmts.pop()
-        delete_stmt = self.stmts.pop()
         mapping = {}
+        delete_rids = []
         for insert, delete in zip(insert_list, delete_list):
             # TODO: make `delete` always a list at the beginning, not here
             if isinstance(delete, int):
                 delete = [delete]
             for each_delete_rid in delete:
                 mapping[each_delete_rid] = insert
+            delete_rids.extend(delete)
 
-        self.stmts.append(("update", (delete_stmt, insert_stmt, mapping), delete_stmt[2]))
-        self.save_operation()
+        # Scattered rids are deleted by more than one stmt
+        num_deletes = len(self._parse_rids(delete_rids))
+        num_inserts = len(self._parse_rids(insert_list))
+        num_stmts = num_deletes + num_inserts
+        if num_stmts == 0:
+            return
+        stmts = self.stmts[len(self.stmts) - num_stmts:]
+        delete_stmts, insert_stmts = stmts[:num_deletes], stmts[num_deletes:]
+        stmt = ("update", (delete_stmts, insert_stmts, mapping), stmts[0][2])
+        self._apply(("update", (num_stmts, stmt)))
 
     def clear(self, keep_history=True):
-        self.stmts = []
-        self.add_rids = []
-        self.remove_rids = []
-        if not keep_history:
-            self.history = []
-        self.save_operation()
+        self._apply(("clear", keep_history))
     
     def get_commit_change(self, version):
         # Return the stmts before commiting `version`
+        try:
+            return list(self.segments[version])
+        except KeyError:
+            raise Exception(f"Version {version} not found in commit history.")
+
+    @staticmethod
+    def _split_history(history):
+        segments = {}
         changes = []
-        for stmt in self.history:
+        for stmt in history:
             changes.append(stmt)
             # ('commit', (2, 'version_2'), datetime.datetime(2024, 5, 18, 16, 52, 35, 107009))
             if stmt[0] == "commit":
-                if stmt[1][0] == version:
-                    return changes
-                else:
-                    changes = []
-        raise Exception(f"Version {version} not found in commit history.")
+                segments[stmt[1][0]] = changes
+                changes = []
+        return segments, changes
     
     def is_empty(self):
         with self.dry_parse():
@@ -164,45 +271,49 @@ class Operation():
     def dry_parse(self):
         add_rids = self.add_rids
         remove_rids = self.remove_rids
-        for stmt in self.stmts:
-            self._parse_stmt(stmt)
-        self._remove_overlapping_rids()
+        self.add_rids, self.remove_rids = self._count_rids(self.stmts)
         yield None
         self.add_rids = add_rids
         self.remove_rids = remove_rids
 
     def parse(self):
-        while self.stmts:
-            stmt = self.stmts.pop(0)
-            self.history.append(stmt)
-            self._parse_stmt(stmt)
-        self._remove_overlapping_rids()
-        self.save_operation()
+        self._apply(("parse", None))
+
+    def _count_rids(self, stmts):
+        # Didn't use set because same entries can be inserted and deleted and then inserted.
+        # Net counts over ranges keep that without expanding them into rids.
+        counter = RidCounter()
+        counter.add_intervals(self.add_rids.intervals)
+        counter.add_intervals(self.remove_rids.intervals, weight=-1)
+        for stmt in stmts:
+            self._parse_stmt(stmt, counter)
+        return (RidRanges(counter.intervals()),
+                RidRanges(counter.intervals(positive=False)))
     
-    def _parse_stmt(self, stmt):
+    def _parse_stmt(self, stmt, counter):
         op, args, timestamp = stmt
         if op == "insert":
             start_rid, num_rids = args
-            self.add_rids.extend(range(start_rid, start_rid + num_rids))
+            counter.add(start_rid, num_rids)
         elif op == "delete":
             start_rid, num_rids = args
-            self.remove_rids.extend(range(start_rid, start_rid + num_rids))
+            counter.add(start_rid, num_rids, weight=-1)
         elif op == "update":
             delete, insert, mapping = args
-            self._parse_stmt(delete)
-            self._parse_stmt(insert)
-
-    def _remove_overlapping_rids(self):
-        from collections import Counter
+            for each_stmt in self._stmt_list(delete) + self._stmt_list(insert):
+                self._parse_stmt(each_stmt, counter)
 
-        # Didn't use set because same entries can be inserted and deleted and then inserted.
-        add = Counter(self.add_rids)
-        remove = Counter(self.remove_rids)
-        self.add_rids = sorted([rid for rid, count in add.items() if count > remove[rid]])
-        self.remove_rids = sorted([rid for rid, count in remove.items() if count > add[rid]])
+    @staticmethod
+    def _stmt_list(stmts):
+        # Updates saved before they could span several stmts hold a single stmt
+        if stmts and isinstance(stmts[0], str):
+            return [stmts]
+        return list(stmts)
 
     @staticmethod 
     def _parse_rids(rids):
+        if isinstance(rids, RidRanges):
+            return [(start, end - start + 1) for start, end in rids.intervals]
         rids = sorted(rids)
         result = []
         try:
@@ -230,33 +341,48 @@ class Operation():
 
     @staticmethod 
     def _construct_history(stmts):
+        # The history is keyed by rid, as the changes and conflicts built
+        # from it are looked up per rid and an update maps each rid on its
+        # own. Deleted ranges are still filled in one call.
         history = {}
         for stmt in stmts:
             op, args, timestamp = stmt
             if op == "insert":
                 pass
             elif op == "delete":
-                for rid in range(args[0], args[0] + args[1]):
-                    history[rid] = (None, timestamp)
+                history.update(dict.fromkeys(range(args[0], args[0] + args[1]),
+                                             (None, timestamp)))
             elif op == "update":
                 delete, _, mapping = args
-                for rid in range(delete[1][0], delete[1][0] + delete[1][1]):
-                    history[rid] = (mapping[rid], timestamp)
+                for delete_stmt in Operation._stmt_list(delete):
+                    start_rid, num_rids = delete_stmt[1]
+                    for rid in range(start_rid, start_rid + num_rids):
+                        history[rid] = (mapping.get(rid), timestamp)
         return history
     
     @staticmethod
     def _solve_changes(history):
+        # Follow each rid to the end of its chain of updates. Every rid on a
+        # followed path is resolved at once, so no chain is walked twice.
         change = {}
-        history = dict(history)
-        for parent_rid, value in history.items(): 
-            next_state = value
-            try:
-                while history[next_state[0]]:
-                    next_state = history[next_state[0]]
-            except:
-                pass
-            change[parent_rid] =  next_state
-        return change
+        for parent_rid in history:
+            path = []
+            on_path = set()
+            rid = parent_rid
+            while True:
+                if rid in change:
+                    final_state = change[rid]
+                    break
+                path.append(rid)
+                on_path.add(rid)
+                next_rid = history[rid][0]
+                if next_rid not in history or next_rid in on_path:
+                    final_state = history[rid]
+                    break
+                rid = next_rid
+            for rid in path:
+                change[rid] = final_state
+        return {rid: change[rid] for rid in history}
     
     @staticmethod
     def _find_conflicts(changes_1, changes_2):
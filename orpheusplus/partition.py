@@ -0,0 +1,163 @@
+from orpheusplus.mysql_manager import MySQLManager
+
+PARTITION_SUFFIX = "_orpheusplus_p"
+DEFAULT_PARTITION_DELTA = 0.5
+
+
+def lyresplit(G, delta=DEFAULT_PARTITION_DELTA):
+    # LyreSplit (OrpheusDB): keep splitting a group of versions while the
+    # average checkout cost |R| (rows in the partition) is more than 1/delta
+    # times the average version size |E|/|V|. Each split cuts the tree edge
+    # with the smallest overlap, so few rows are duplicated by the cut.
+    # A smaller delta gives fewer partitions and less duplication.
+    parents = _spanning_tree(G)
+    partitions = []
+    stack = [set(G.nodes)] if G.number_of_nodes() else []
+    while stack:
+        versions = stack.pop()
+        num_records = estimate_records(G, versions, parents)
+        num_edges = sum(G.nodes[version].get("num_rids", 0) for version in versions)
+        cut = None
+        if len(versions) > 1 and num_edges < delta * len(versions) * num_records:
+            edges = [(parents[version], version) for version in versions
+                     if parents[version] in versions]
+            cut = min(edges, key=lambda edge: G.edges[edge]["overlap"], default=None)
+        if cut is None:
+            partitions.append(sorted(versions))
+            continue
+        subtree = _subtree(parents, versions, cut[1])
+        stack.append(versions - subtree)
+        stack.append(subtree)
+    return sorted(partitions)
+
+
+def estimate_records(G, versions, parents=None):
+    # Distinct rows of `versions`: in a version tree a child only adds the
+    # rows it doesn't share with its parent.
+    if parents is None:
+        parents = _spanning_tree(G)
+    num_records = 0
+    for version in versions:
+        num_records += G.nodes[version].get("num_rids", 0)
+        if parents[version] in versions:
+            num_records -= G.edges[parents[version], version]["overlap"]
+    return num_records
+
+
+def _spanning_tree(G):
+    # A merged version keeps only the parent it shares most rows with
+    parents = {}
+    for version in G.nodes:
+        predecessors = list(G.predecessors(version))
+        parents[version] = max(predecessors, default=None,
+                               key=lambda parent: G.edges[parent, version]["overlap"])
+    return parents
+
+
+def _subtree(parents, versions, root):
+    children = {}
+    for version in versions:
+        children.setdefault(parents[version], []).append(version)
+    subtree = set()
+    stack = [root]
+    while stack:
+        version = stack.pop()
+        subtree.add(version)
+        stack.extend(children.get(version, []))
+    return subtree
+
+
+class DataPartitions():
+    # Each partition table holds the rows of a group of versions, so a
+    # checkout only scans the partition of its version. The data table stays
+    # the complete copy of all rows.
+    def __init__(self, cnx: MySQLManager, table_name, data_table, version_graph):
+        self.cnx = cnx
+        self.table_name = table_name
+        self.data_table = data_table
+        self.version_graph = version_graph
+
+    def is_enabled(self):
+        return "partition_generation" in self.version_graph.G.graph
+
+    def get_table(self, version):
+        G = self.version_graph.G
+        if not self.is_enabled() or not G.has_node(version):
+            return None
+        partition = G.nodes[version].get("partition")
+        if partition is None:
+            return None
+        return self._partition_table(G.graph["partition_generation"], partition)
+
+    def repartition(self, delta=DEFAULT_PARTITION_DELTA):
+        # Build the new layout next to the old one and switch the version
+        # graph over only when it is complete, so checkouts keep working.
+        G = self.version_graph.G
+        version_table = self.version_graph.version_table
+        old_tables = self._get_tables()
+        generation = G.graph.get("partition_generation", -1) + 1
+        partitions = lyresplit(G, delta)
+        for partition, versions in enumerate(partitions):
+            table = self._partition_table(generation, partition)
+            self.cnx.execute(f"CREATE TABLE {table} LIKE {self.data_table}")
+            for version in versions:
+                self.cnx.execute(f"INSERT IGNORE INTO {table} SELECT * FROM {self.data_table} "
+                                 f"WHERE {version_table.rid_filter(version)}")
+            self.cnx.commit()
+
+        for partition, versions in enumerate(partitions):
+            for version in versions:
+                G.nodes[version]["partition"] = partition
+        G.graph["partition_generation"] = generation
+        G.graph["partition_count"] = len(partitions)
+        G.graph["partition_delta"] = delta
+        self.version_graph._save_graph()
+        self._drop_tables(old_tables)
+        return partitions
+
+    def add_version(self, version, parent, from_table, where_stmt):
+        # A new version joins the partition of its parent, which only lacks
+        # the rows matching `where_stmt` in `from_table`
+        if not self.is_enabled():
+            return
+        G = self.version_graph.G
+        generation = G.graph["partition_generation"]
+        partition = G.nodes[parent].get("partition") if G.has_node(parent) else None
+        if partition is None:
+            # A new partition is filled with all rows of the version, which
+            # are already in the data table
+            partition = G.graph["partition_count"]
+            G.graph["partition_count"] += 1
+            self.cnx.execute(f"CREATE TABLE {self._partition_table(generation, partition)} "
+                             f"LIKE {self.data_table}")
+            from_table = self.data_table
+            where_stmt = f"WHERE {self.version_graph.version_table.rid_filter(version)}"
+        G.nodes[version]["partition"] = partition
+        if where_stmt:
+            self.cnx.execute(f"INSERT IGNORE INTO {self._partition_table(generation, partition)} "
+                             f"SELECT * FROM {from_table} {where_stmt}")
+            self.cnx.commit()
+        self.version_graph._save_graph()
+
+    def remove(self):
+        G = self.version_graph.G
+        self._drop_tables(self._get_tables())
+        for version in G.nodes:
+            G.nodes[version].pop("partition", None)
+        for attr in ["partition_generation", "partition_count", "partition_delta"]:
+            G.graph.pop(attr, None)
+        self.version_graph._save_graph()
+
+    def _get_tables(self):
+        G = self.version_graph.G
+        if not self.is_enabled():
+            return []
+        return [self._partition_table(G.graph["partition_generation"], partition)
+                for partition in range(G.graph["partition_count"])]
+
+    def _drop_tables(self, tables):
+        for table in tables:
+            self.cnx.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def _partition_table(self, generation, partition):
+        return f"{self.table_name}{PARTITION_SUFFIX}{generation}_{partition}"
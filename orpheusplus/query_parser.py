@@ -4,18 +4,21 @@ from sqlparse.lexer import Lexer
 from sqlparse.sql import Identifier, IdentifierList, Token, Where
 
 from orpheusplus.user_manager import UserManager
-from orpheusplus.version_data import DATA_TABLE_SUFFIX
 from orpheusplus.version_data import HEAD_SUFFIX as head_suffix
-from orpheusplus.version_table import VERSION_TABLE_SUFFIX
+from orpheusplus.version_graph import VersionGraph
+from orpheusplus.version_table import get_version_table
 
 lex = Lexer.get_default_instance()
 lex.add_keywords({"VTABLE": sqlparse.tokens.Keyword,
                   "VERSION": sqlparse.tokens.Keyword})
 
-HEAD_SUFFIX = head_suffix + "_" + UserManager().info["user"]
+USER_INFO = UserManager().info
+HEAD_SUFFIX = head_suffix + "_" + USER_INFO["user"]
 
 class SQLParser():
-    def __init__(self):
+    def __init__(self, cnx=None):
+        # Some storage models stage rids on the connection that runs the query
+        self.cnx = cnx
         self.stmts = []
         self.parsed = []
         self.operations = []
@@ -34,7 +37,7 @@ class SQLParser():
     def _parse_stmts(self):
         for stmt in self.stmts:
             tokens = self._strip_unwanted_tokens(stmt.tokens)
-            parsed_tokens = self._handle_keywords(tokens)
+            parsed_tokens = self._handle_keywords(tokens, self.cnx)
             if tokens == parsed_tokens:
                 self.is_modified.append(False)
             else:
@@ -49,7 +52,7 @@ class SQLParser():
                 self.parsed.append(parsed_tokens)
 
     @staticmethod           
-    def _handle_keywords(tokens):
+    def _handle_keywords(tokens, cnx=None):
         """
         e.g., SELECT * FROM VTABLE new_table;
         equiv. to:
@@ -72,7 +75,7 @@ class SQLParser():
         SQLParser._check_version_syntax(tokens, version_indices)
         
         if version_indices:
-            tokens = SQLParser._handle_version(tokens, version_indices)
+            tokens = SQLParser._handle_version(tokens, version_indices, cnx)
         
         vtable_indices = []
         for idx, token in enumerate(tokens):
@@ -142,17 +145,19 @@ class SQLParser():
             raise SyntaxError("Invalid SQL statement")
 
     @staticmethod
-    def _handle_version(tokens, indices):
+    def _handle_version(tokens, indices, cnx=None):
         for idx in indices:
             vtable_idx = idx - 3
             table_name_idx = idx - 2
             of_idx = idx - 1
             version_num_idx= idx + 1
+            table_name = tokens[table_name_idx].value
+            # The storage model of the table decides where its versions live
+            storage = VersionGraph.get_storage(USER_INFO["database"], table_name)
+            version_table = get_version_table(cnx, table_name, storage)
             replace = (
-                f"{tokens[table_name_idx].value}{DATA_TABLE_SUFFIX} "
-                f"WHERE rid IN ("
-                f"SELECT rid FROM {tokens[table_name_idx].value}{VERSION_TABLE_SUFFIX} "
-                f"WHERE version = {tokens[version_num_idx]})"
+                f"{version_table.data_table} "
+                f"WHERE {version_table.rid_filter(tokens[version_num_idx].value)}"
             )
             
             where_indices = SQLParser._get_where(tokens)
@@ -2,6 +2,7 @@ import csv
 import re
 import sys
 from collections import OrderedDict
+from itertools import islice
 
 
 def parse_commit(commit):
@@ -38,11 +39,18 @@ def parse_csv_structure(filepath) -> list:
 
 
 def parse_csv_data(filepath):
-    data = []
+    return list(iter_csv_data(filepath))
+
+
+def iter_csv_data(filepath):
     with open(filepath, newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        data = list(reader)
-    return data
+        yield from csv.reader(f)
+
+
+def iter_chunks(rows, chunk_size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
 
 
 def match_column_order(table_cols, cols):
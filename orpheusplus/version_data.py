@@ -1,23 +1,38 @@
 import csv
 import sys
+import tempfile
 import time
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from orpheusplus import LOG_DIR
-from orpheusplus.mysql_manager import MySQLManager
+from orpheusplus.diff_cache import DiffCache
+from orpheusplus.intervals import RidRanges
+from orpheusplus.mysql_manager import FETCH_PAGE_SIZE, STAGE_BATCH_SIZE, MySQLManager
 from orpheusplus.operation import Operation
-from orpheusplus.utils import (match_column_order, parse_commit,
-                               parse_csv_data, parse_csv_structure,
+from orpheusplus.partition import DEFAULT_PARTITION_DELTA, DataPartitions, estimate_records
+from orpheusplus.utils import (iter_chunks, iter_csv_data, match_column_order,
+                               parse_commit, parse_csv_structure,
                                parse_table_types, reorder_data)
 from orpheusplus.version_graph import VersionGraph
-from orpheusplus.exceptions import NonEmptyOperation
+from orpheusplus.version_table import DATA_TABLE_SUFFIX, DEFAULT_STORAGE, get_version_table
+from orpheusplus.exceptions import MySQLError, NonEmptyOperation
 
-DATA_TABLE_SUFFIX = "_orpheusplus"
 HEAD_SUFFIX = "_orpheusplus_head"
+# Rows of a data file applied at a time
+CSV_CHUNK_SIZE = 10000
+# Last rid handed out for the table
+SEQUENCE_SUFFIX = "_orpheusplus_sequence"
+# Temporary table of the rows matched against the head table
+MATCH_STAGE_SUFFIX = "_orpheusplus_match"
+# Use a delta checkout when the estimated number of changed rows is below
+# this fraction of the rows a full checkout would rewrite.
+DELTA_CHECKOUT_RATIO = 0.5
+# Conflicting rows fetched per query when writing a conflict file
+CONFLICT_BATCH_SIZE = 5000
 
 
 class VersionData():
-    data_table_suffix = DATA_TABLE_SUFFIX
     # The table used to store the current version of the table
 
     def __init__(self, cnx: MySQLManager):
@@ -28,9 +43,11 @@ class VersionData():
         self.table_structure = None
         self.version_graph = None
         self.operation = None
+        self.partitions = None
+        self.diff_cache = None
         VersionData.head_suffix = HEAD_SUFFIX + "_" + self.user
 
-    def init_table(self, table_name, table_structure_path):
+    def init_table(self, table_name, table_structure_path, storage=DEFAULT_STORAGE):
         self.table_name = table_name
         table_structure = parse_csv_structure(table_structure_path)
 
@@ -39,25 +56,41 @@ class VersionData():
         stmt_structure = ", ".join(
             [f"`{each_col[0]}` {each_col[1]}" for each_col in table_structure])
         cols = "rid INT PRIMARY KEY, " + stmt_structure
-        stmt = f"CREATE TABLE {table_name}{self.data_table_suffix} ({cols})"
+        # The storage model names the data table. The version graph is only
+        # created once the tables are.
+        data_table = get_version_table(self.cnx, table_name, storage).data_table
+        stmt = f"CREATE TABLE {data_table} ({cols})"
         self.cnx.execute(stmt)
 
         # Initialize the table for the current version
-        stmt = f"CREATE TABLE {table_name}{self.head_suffix} LIKE {table_name}{self.data_table_suffix}"
+        stmt = f"CREATE TABLE {table_name}{self.head_suffix} LIKE {data_table}"
         self.cnx.execute(stmt)
 
         # rid starts from 1 in data table
-        stmt = f"ALTER TABLE {table_name}{self.data_table_suffix} AUTO_INCREMENT = 1"
+        stmt = f"ALTER TABLE {data_table} AUTO_INCREMENT = 1"
         self.cnx.execute(stmt)
 
+        # rid sequence shared by all users of the table
+        self.cnx.execute(f"DROP TABLE IF EXISTS {table_name}{SEQUENCE_SUFFIX}")
+        self._create_rid_sequence()
+
         # The graph for tracking version dependency
-        self._create_version_graph()
+        self._create_version_graph(storage)
         self._init_user_operation()
         self.table_structure = self._get_table_types()
 
-    def _create_version_graph(self):
+    def _create_version_graph(self, storage=DEFAULT_STORAGE):
         self.version_graph = VersionGraph(self.cnx)
-        self.version_graph.init_version_graph(self.db_name, self.table_name)
+        self.version_graph.init_version_graph(self.db_name, self.table_name, storage)
+        self._init_partitions()
+        # Drop diffs left by a removed table of the same name
+        self.diff_cache = DiffCache(self.db_name, self.table_name)
+        self.diff_cache.remove()
+
+    def _init_partitions(self):
+        self.partitions = DataPartitions(self.cnx, self.table_name,
+                                         self.version_graph.version_table.data_table,
+                                         self.version_graph)
 
     def _init_user_operation(self):
         self.operation = Operation()
@@ -68,7 +101,7 @@ class VersionData():
             self.operation.init_operation(self.db_name, self.table_name, 
                 self.version_graph.version_count, self.user)
 
-    def from_table(self, from_table, to_table):
+    def from_table(self, from_table, to_table, storage=DEFAULT_STORAGE):
         table_structure = self._get_table_types(from_table)
         rows = [[col, col_type] for col, col_type in table_structure.items()]
         try:
@@ -77,16 +110,20 @@ class VersionData():
                       encoding="utf-8") as f:
                 writer = csv.writer(f)
                 writer.writerows(rows)
-            self.init_table(to_table, temp_csv_filepath)
+            self.init_table(to_table, temp_csv_filepath, storage)
         except Exception as e:
             print(e)
         temp_csv_filepath.unlink()
 
     def load_table(self, table_name):
         self.table_name = table_name
-        self.table_structure = self._get_table_types()
         self.version_graph = VersionGraph(self.cnx)
         self.version_graph.load_version_graph(self.db_name, table_name)
+        self.table_structure = self._get_table_types()
+        self._init_partitions()
+        self.diff_cache = DiffCache(self.db_name, table_name)
+        # Tables created before the rid sequence
+        self._create_rid_sequence()
         self.operation = Operation()
         try:
             self.operation.load_operation(self.db_name, self.table_name,
@@ -95,15 +132,10 @@ class VersionData():
             self.operation.init_operation(self.db_name, self.table_name, 
                                           self.version_graph.version_count, self.user)
             # Initialize the table for the current version
-            stmt = f"CREATE TABLE {table_name}{self.head_suffix} LIKE {table_name}{self.data_table_suffix}"
+            stmt = (f"CREATE TABLE {table_name}{self.head_suffix} "
+                    f"LIKE {self.version_graph.version_table.data_table}")
             self.cnx.execute(stmt)
-            rids = self.version_graph.version_table.get_version_rids(self.version_graph.version_count)
-            stmt = (f"INSERT INTO {self.table_name}{self.head_suffix} "
-                f"SELECT * FROM {self.table_name}{self.data_table_suffix} "
-                f"WHERE rid = %s")
-            rids = [(rid, ) for rid in rids]
-            self.cnx.executemany(stmt, rids)
-            self.cnx.commit()
+            self._materialize_head(self.version_graph.version_count)
             self.version_graph.head = self.version_graph.version_count
         except:
             print("Corrupted version table.")
@@ -124,10 +156,13 @@ class VersionData():
             sys.exit()
 
 
-    def checkout(self, version):
-        if version == self.get_current_version():
+    def checkout(self, version, mode="auto"):
+        current_version = self.get_current_version()
+        if version == current_version:
             print("Discard all changes.")
             self.operation.clear()
+            # The head table holds uncommitted rows, so only a rebuild is safe
+            mode = "full"
         elif not self.operation.is_empty():
             raise NonEmptyOperation(
                 "Please commit changes or discard them by `checkout head`")
@@ -136,35 +171,200 @@ class VersionData():
             print(f"Version {version} doesn't exist.")
             sys.exit()
 
+        if mode == "auto":
+            mode = self._choose_checkout_mode(current_version, version)
+
         self.operation.switch_user_version_head(version)
-        rids = self.version_graph.switch_version(version)
-        rids = [(rid, ) for rid in rids]
+        self.version_graph.switch_version(version)
+        if mode == "delta":
+            self._apply_head_delta(version)
+        else:
+            self._materialize_head(version)
+
+    def _choose_checkout_mode(self, current_version, version):
+        # A full checkout rewrites every row of both versions while a delta
+        # checkout only rewrites the rows that differ between them.
+        delta = self.version_graph.estimate_delta(current_version, version)
+        if delta is None:
+            return "full"
+        full = (self.version_graph.get_num_rids(current_version) +
+                self.version_graph.get_num_rids(version))
+        return "delta" if delta < full * DELTA_CHECKOUT_RATIO else "full"
+
+    def _apply_head_delta(self, version):
+        # The head table holds exactly the committed rows of the current
+        # version here, so anti-joins against `version` give the delta.
+        version_table = self.version_graph.version_table
+        stmt = (f"DELETE FROM {self.table_name}{self.head_suffix} "
+                f"WHERE NOT ({version_table.rid_filter(version)})")
+        self.cnx.execute(stmt)
+        stmt = (f"INSERT INTO {self.table_name}{self.head_suffix} "
+                f"SELECT d.* FROM {self._source_table(version)} AS d "
+                f"LEFT JOIN {self.table_name}{self.head_suffix} AS h ON h.rid = d.rid "
+                f"WHERE h.rid IS NULL AND {version_table.rid_filter(version, 'd.rid')}")
+        self.cnx.execute(stmt)
+        self.cnx.commit()
+
+    def _materialize_head(self, version):
+        # Rebuild the head table with a single join against the version table
+        # so that the rids of `version` never leave MySQL.
+        rid_filter = self.version_graph.version_table.rid_filter(version, "d.rid")
         stmt = f"DELETE FROM {self.table_name}{self.head_suffix}"
         self.cnx.execute(stmt)
         stmt = (f"INSERT INTO {self.table_name}{self.head_suffix} "
-                f"SELECT * FROM {self.table_name}{self.data_table_suffix} "
-                f"WHERE rid = %s")
-        self.cnx.executemany(stmt, rids)
+                f"SELECT d.* FROM {self._source_table(version)} AS d "
+                f"WHERE {rid_filter}")
+        self.cnx.execute(stmt)
         self.cnx.commit()
 
+    def _source_table(self, version):
+        # The partition of `version` is much smaller than the data table
+        partition_table = self.partitions.get_table(version)
+        if partition_table is None:
+            return self.version_graph.version_table.data_table
+        return partition_table
+
+    def repartition(self, delta=DEFAULT_PARTITION_DELTA):
+        if self.version_graph.version_count == 0:
+            print("No version to partition.")
+            return
+        partitions = self.partitions.repartition(delta)
+        num_records = sum(estimate_records(self.version_graph.G, versions)
+                          for versions in partitions)
+        total_records = estimate_records(self.version_graph.G, self.version_graph.G.nodes)
+        print(f"Split {self.version_graph.version_count} versions into {len(partitions)} partitions.")
+        print(f"Partitions hold about {num_records} rows "
+              f"({num_records / max(total_records, 1):.2f}x the versioned rows).")
+
     def diff(self, version_1, version_2):
-        rids_1 = self.version_graph.version_table.get_version_rids(version_1)
-        rids_2 = self.version_graph.version_table.get_version_rids(version_2)
-        rids_1 = set(rids_1)
-        rids_2 = set(rids_2)
-        v1_diff_v2 = self.select_by_rid(list(rids_1 - rids_2))
-        v2_diff_v1 = self.select_by_rid(list(rids_2 - rids_1))
-        fields = [col[0] for col in self.cnx.cursor.description]
-        # Remove `rid`
-        fields = fields[1:]
+        # Rows in only one of the versions, streamed from MySQL in pages
+        self._check_versions(version_1, version_2)
+        fields = list(self.table_structure.keys())
+        fields.remove("rid")
+        cached = self.diff_cache.get(version_1, version_2)
+        if cached is not None:
+            return {
+                "fields": fields,
+                "v1_diff_v2": self._diff_pages(cached[0]),
+                "v2_diff_v1": self._diff_pages(cached[1])
+            }
+
+        # Anti-joins in MySQL. The streamed rids are cached once both sides
+        # are read.
+        streamed = {}
+
+        def pages(version, other):
+            intervals = []
+            stmt = self.version_graph.version_table.diff_rows_stmt(version, other)
+            for page in self.cnx.fetch_pages(stmt):
+                for each in page:
+                    if intervals and each[0] == intervals[-1][1] + 1:
+                        intervals[-1][1] = each[0]
+                    else:
+                        intervals.append([each[0], each[0]])
+                # Remove `rid`
+                yield [each[1:] for each in page]
+            streamed[version] = RidRanges([tuple(each) for each in intervals])
+            if len(streamed) == 2:
+                self.diff_cache.put(version_1, version_2,
+                                    streamed[version_1], streamed[version_2])
 
         return {
             "fields": fields,
-            "v1_diff_v2": v1_diff_v2,
-            "v2_diff_v1": v2_diff_v1
+            "v1_diff_v2": pages(version_1, version_2),
+            "v2_diff_v1": pages(version_2, version_1)
         }
 
-    def merge(self, version, resolved_file=None):
+    def diff_updates(self, version_1, version_2):
+        # Like `diff`, but rows updated between the versions are paired by
+        # the update mapping along the graph path instead of being listed as
+        # removed and inserted
+        self._check_versions(version_1, version_2)
+        version_table = self.version_graph.version_table
+        fields = list(self.table_structure.keys())
+        fields.remove("rid")
+        rids_1, rids_2 = self._diff_rids(version_1, version_2)
+        changes_1, changes_2 = self.version_graph.gather_changes(version_2, base=version_1)
+        pairs = self._pair_updates(changes_1, changes_2, rids_1, rids_2)
+
+        def updated_pages():
+            remaining = iter(pairs)
+            while batch := list(islice(remaining, FETCH_PAGE_SIZE)):
+                rows = self._select_rows_by_rid([rid for pair in batch for rid in pair])
+                page = []
+                for rid_1, rid_2 in batch:
+                    before, after = rows[rid_1], rows[rid_2]
+                    changed = [idx for idx, (value_1, value_2) in enumerate(zip(before, after))
+                               if value_1 != value_2]
+                    page.append((before, after, changed))
+                yield page
+
+        def pages(version, other, paired_rids):
+            # Only the paired rids are staged, the rest is an anti-join
+            excluded = self.cnx.rid_condition(paired_rids, "d.rid") if paired_rids else None
+            stmt = version_table.diff_rows_stmt(version, other, excluded)
+            for page in self.cnx.fetch_pages(stmt):
+                yield [each[1:] for each in page]
+            self.cnx.drop_staged()
+
+        return {
+            "fields": fields,
+            "updated": updated_pages(),
+            "v1_diff_v2": pages(version_1, version_2, [rid_1 for rid_1, _ in pairs]),
+            "v2_diff_v1": pages(version_2, version_1, [rid_2 for _, rid_2 in pairs])
+        }
+
+    def _check_versions(self, *versions):
+        # A diff against a version that doesn't exist yet would be cached as
+        # a diff against an empty version
+        for version in versions:
+            if version not in self.version_graph.G:
+                print(f"Version {version} doesn't exist.")
+                sys.exit()
+
+    def _diff_rids(self, version_1, version_2):
+        # Committed versions never change, so their diff is cached
+        rids = self.diff_cache.get(version_1, version_2)
+        if rids is None:
+            rids = self.version_graph.version_table.diff_rids(version_1, version_2)
+            self.diff_cache.put(version_1, version_2, *rids)
+            rids = tuple(RidRanges.from_rids(each) for each in rids)
+        return rids
+
+    def _diff_pages(self, rids):
+        # Rows of cached diff rids
+        if not rids:
+            return
+        stmt = (f"SELECT * FROM {self.version_graph.version_table.data_table} "
+                f"WHERE {self.cnx.rid_condition(rids)} ORDER BY rid")
+        for page in self.cnx.fetch_pages(stmt):
+            # Remove `rid`
+            yield [each[1:] for each in page]
+        self.cnx.drop_staged()
+
+    @staticmethod
+    def _pair_updates(changes_1, changes_2, rids_1, rids_2):
+        # (rid in version 1, rid in version 2) of the ancestor rows that at
+        # least one version updated. Both rids must be in only their own
+        # version, which skips rows inserted after the ancestor.
+        pairs = []
+        for rid in changes_1.keys() | changes_2.keys():
+            rid_1 = changes_1[rid][0] if rid in changes_1 else rid
+            rid_2 = changes_2[rid][0] if rid in changes_2 else rid
+            # A row deleted by either version stays in the plain listings
+            if rid_1 is None or rid_2 is None:
+                continue
+            if rid_1 in rids_1 and rid_2 in rids_2:
+                pairs.append((rid_1, rid_2))
+        return sorted(pairs)
+
+    def diff_stat(self, version_1, version_2):
+        # Numbers of rows in only one of the versions, from the version table
+        self._check_versions(version_1, version_2)
+        rids_1, rids_2 = self._diff_rids(version_1, version_2)
+        return len(rids_1), len(rids_2)
+
+    def merge(self, version, resolved_file=None, by_column=False):
         if not self.operation.is_empty():
             print(
                 "Please commit changes or discard them by `checkout head` before merging"
@@ -176,23 +376,42 @@ class VersionData():
         changed_rids = set(list(changes_head.keys()) + list(changes_version.keys()))
         keep_rids = set()
         delete_rids = set()
+        merged_rows = []
+        column_conflicts = {}
+        if conflicts and by_column:
+            conflicts, dropped_rids, merged_rows, column_conflicts = \
+                self._resolve_column_conflicts(conflicts)
+            delete_rids.update(dropped_rids)
         if conflicts:
             if resolved_file is None:
-                self._write_conflict_file(version, conflicts)
+                self._write_conflict_file(version, conflicts, column_conflicts)
                 sys.exit()
             else:
                 try:
-                    parsed = self._parse_keep_or_delete(resolved_file, conflicts, version)
+                    parsed = self._parse_keep_or_delete(resolved_file, conflicts, version,
+                                                        column_conflicts)
                     keep_rids = set(parsed[0])
-                    delete_rids = set(parsed[1])
+                    delete_rids.update(parsed[1])
                     print("Resolve conflicts.")
                 except:
                     raise Exception("Invalid resolved file. Abort merge.")
+                # The side kept for a row only decides its conflicting
+                # columns, the other columns are merged
+                to_combine = []
+                for parent_rid, sources in column_conflicts.items():
+                    (head_rid, _), (version_rid, _) = conflicts[parent_rid]
+                    if (head_rid in keep_rids) == (version_rid in keep_rids):
+                        continue
+                    choice = 0 if head_rid in keep_rids else 1
+                    sources = [choice if source is None else source for source in sources]
+                    delete_rids.update([head_rid, version_rid])
+                    to_combine.append((head_rid, version_rid, sources))
+                merged_rows.extend(self._combine_rows(to_combine))
 
-        rids_in_head = self.version_graph.version_table.get_version_rids(
-            self.version_graph.head)
-        rids_in_version = self.version_graph.version_table.get_version_rids(
-            version)
+        head_changes, version_changes = self.version_graph.version_table.merge_rids(
+            self.version_graph.head, version, changed_rids | delete_rids,
+            diff=self.diff_cache.get(self.version_graph.head, version))
+        merged_rids = self._insert_merged_rows(merged_rows)
         next_version = self.version_graph.version_count + 1
 
         commit_info = {
@@ -201,57 +420,168 @@ class VersionData():
             "now": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        total_rids = set(rids_in_version + rids_in_head)
-        total_rids = total_rids - changed_rids - delete_rids
-        rids_in_head = set(rids_in_head)
-        rids_in_version = set(rids_in_version)
-
         # Head
-        rids_to_add = total_rids - rids_in_head
-        rids_to_delete = rids_in_head - total_rids
+        rids_to_add, rids_to_delete = head_changes
         self.operation.insert(rids_to_add)
+        self.operation.insert(merged_rids)
         self.operation.delete(rids_to_delete)
         self.operation.parse()
+        old_head = self.version_graph.head
         self.version_graph.add_version(self.operation, **commit_info)
+        rid_filter = self.version_graph.version_table.rid_filter(next_version)
+        self.partitions.add_version(next_version, old_head,
+                                    self.version_graph.version_table.data_table,
+                                    f"WHERE {rid_filter}")
 
         # Version
-        rids_to_add = total_rids - rids_in_version
-        rids_to_delete = rids_in_version - total_rids
+        rids_to_add, rids_to_delete = version_changes
         operation = Operation()
         try:
             operation.load_operation(self.db_name, self.table_name, version)
         except FileNotFoundError:
             operation.init_operation(self.db_name, self.table_name, version)
         operation.insert(rids_to_add)
+        operation.insert(merged_rids)
         operation.delete(rids_to_delete)
         operation.parse()
         self.version_graph.merge_version(operation,
                                          from_version=version,
                                          to_version=next_version,
                                          **commit_info)
+        # The head table still holds the rows of the previous head
+        self._apply_head_delta(next_version)
         self._save_log(**commit_info)
 
-    def _write_conflict_file(self, version, conflicts):
+    def _resolve_column_conflicts(self, conflicts):
+        # Both versions updated the same row. Compare the column hashes of
+        # the ancestor, head and version rows and keep the conflicts that
+        # changed the same column differently. Return the remaining
+        # conflicts, the rids to drop, the merged rows to insert and the
+        # per-column sources of the remaining conflicts (None where both
+        # changed a column).
+        remaining_conflicts = {}
+        column_conflicts = {}
+        dropped_rids = []
+        merged_rows = []
+        remaining = iter(conflicts.items())
+        while batch := list(islice(remaining, CONFLICT_BATCH_SIZE)):
+            rids = [rid for parent_rid, ((head_rid, _), (version_rid, _)) in batch
+                    if head_rid is not None and version_rid is not None
+                    for rid in (parent_rid, head_rid, version_rid)]
+            hashes = self._select_column_hashes(rids)
+            to_combine = []
+            for parent_rid, conflict in batch:
+                (head_rid, _), (version_rid, _) = conflict
+                sources = None
+                if head_rid is not None and version_rid is not None:
+                    sources = self._merge_columns(hashes[parent_rid], hashes[head_rid],
+                                                  hashes[version_rid])
+                if sources is None:
+                    remaining_conflicts[parent_rid] = conflict
+                elif None in sources:
+                    remaining_conflicts[parent_rid] = conflict
+                    column_conflicts[parent_rid] = sources
+                elif not any(sources):
+                    dropped_rids.append(version_rid)
+                elif all(sources):
+                    dropped_rids.append(head_rid)
+                else:
+                    dropped_rids.extend([head_rid, version_rid])
+                    to_combine.append((head_rid, version_rid, sources))
+            merged_rows.extend(self._combine_rows(to_combine))
+        resolved = len(conflicts) - len(remaining_conflicts)
+        if resolved:
+            print(f"Resolve {resolved} conflicts by column.")
+        return remaining_conflicts, dropped_rids, merged_rows, column_conflicts
+
+    def _combine_rows(self, to_combine):
+        # Rows taking each column from the head (0) or version (1) row
+        rows = self._select_rows_by_rid([rid for head_rid, version_rid, _ in to_combine
+                                         for rid in (head_rid, version_rid)])
+        combined = []
+        for head_rid, version_rid, sources in to_combine:
+            row = zip(rows[head_rid], rows[version_rid])
+            combined.append([pair[source] for pair, source in zip(row, sources)])
+        return combined
+
+    @staticmethod
+    def _merge_columns(ancestor, head, version):
+        # Per-column three-way merge. Return 0 (head), 1 (version) or None
+        # (both changed it differently) for each column.
+        sources = []
+        for base, head_value, version_value in zip(ancestor, head, version):
+            if head_value == version_value or version_value == base:
+                sources.append(0)
+            elif head_value == base:
+                sources.append(1)
+            else:
+                sources.append(None)
+        return sources
+
+    def _select_column_hashes(self, rids):
+        # {rid: MD5 of each column}, NULL columns hash to None
+        if not rids:
+            return {}
+        cols = list(self.table_structure.keys())
+        cols.remove("rid")
+        hash_stmt = ", ".join(f"MD5({col})" for col in cols)
+        stmt = (f"SELECT rid, {hash_stmt} FROM {self.version_graph.version_table.data_table} "
+                f"WHERE {self.cnx.rid_condition(rids)}")
+        result = self.cnx.execute(stmt)
+        self.cnx.drop_staged()
+        return {each[0]: each[1:] for each in result}
+
+    def _insert_merged_rows(self, merged_rows):
+        if not merged_rows:
+            return []
+        max_rid = self._reserve_rids(len(merged_rows))
+        arg_stmt = self._arg_stmt(self.table_structure, with_rid=True)
+        data = self.add_rid(merged_rows, max_rid)
+        stmt = (f"INSERT INTO {self.version_graph.version_table.data_table} "
+                f"({self._rid_last_cols()}) VALUES {arg_stmt}")
+        self.cnx.executemany(stmt, data)
+        self.cnx.commit()
+        return list(range(max_rid + 1, max_rid + 1 + len(data)))
+
+    def _write_conflict_file(self, version, conflicts, column_conflicts=None):
+        # Rows in `column_conflicts` only show their conflicting columns.
+        # Each row ends with its conflict's rid and whether it was written
+        # by column, so the resolved file can be checked against the merge.
         cols = list(self.table_structure.keys())
         cols.remove("rid")
         write_cols = ["select_head"] + cols + ["timestamp"] + \
-            [f"select_{version}"] + cols + ["timestamp"]
+            [f"select_{version}"] + cols + ["timestamp"] + ["conflict_rid", "by_column"]
         conflict_path = f"./conflicts_{int(time.time())}.csv"
         with open(conflict_path, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow(write_cols)
-            for (head_rid, head_timestamp), (version_rid, version_timestamp) in conflicts.values():
-                if head_rid is None:
-                    head_data = [""] * len(cols)
-                else:
-                    head_data = list(self.select_by_rid(head_rid)[0])
-                if version_rid is None:
-                    version_data = [""] * len(cols)
-                else:
-                    version_data = list(self.select_by_rid(version_rid)[0])
-                select = (1, 0) if head_timestamp > version_timestamp else (0, 1)
-                writer.writerow([select[0]] + head_data + [head_timestamp] +
-                                [select[1]] + version_data + [version_timestamp])
+            # Fetch the rows of a batch of conflicts in one query
+            remaining = iter(conflicts.items())
+            while batch := list(islice(remaining, CONFLICT_BATCH_SIZE)):
+                rids = [rid for _, ((head_rid, _), (version_rid, _)) in batch
+                        for rid in (head_rid, version_rid) if rid is not None]
+                rows = self._select_rows_by_rid(rids)
+                for parent_rid, conflict in batch:
+                    (head_rid, head_timestamp), (version_rid, version_timestamp) = conflict
+                    if head_rid is None:
+                        head_data = [""] * len(cols)
+                    else:
+                        head_data = list(rows[head_rid])
+                    if version_rid is None:
+                        version_data = [""] * len(cols)
+                    else:
+                        version_data = list(rows[version_rid])
+                    sources = column_conflicts.get(parent_rid) if column_conflicts else None
+                    by_column = int(sources is not None)
+                    if sources is not None:
+                        head_data = [value if source is None else ""
+                                     for value, source in zip(head_data, sources)]
+                        version_data = [value if source is None else ""
+                                        for value, source in zip(version_data, sources)]
+                    select = (1, 0) if head_timestamp > version_timestamp else (0, 1)
+                    writer.writerow([select[0]] + head_data + [head_timestamp] +
+                                    [select[1]] + version_data + [version_timestamp] +
+                                    [parent_rid, by_column])
         print(f"Find conflicts in {len(conflicts)} rows.")
         print(
             f"Save conflicts to {conflict_path}. Please resolve it by marking the rows as `1`."
@@ -259,7 +589,12 @@ class VersionData():
         print(f"Try `merge` again with resolved file.")
 
     @staticmethod
-    def _parse_keep_or_delete(resolved_file, conflicts, version):
+    def _parse_keep_or_delete(resolved_file, conflicts, version, column_conflicts=None):
+        # Rows of the resolved file are read one at a time, in the same
+        # order as the conflicts were written. A file with more or fewer
+        # rows than conflicts, or written for other conflicts or by another
+        # mode of merge, raises ValueError.
+        column_conflicts = column_conflicts or {}
         keep_rids = []
         delete_rids = []
         with open(resolved_file, "r") as f:
@@ -267,8 +602,20 @@ class VersionData():
             headers = next(reader)
             select_head_idx = headers.index("select_head")
             select_version_idx = headers.index(f"select_{version}")
-            for idx, row in enumerate(reader):
-                conflict = conflicts[idx + 1]
+            if "conflict_rid" in headers:
+                conflict_rid_idx = headers.index("conflict_rid")
+                by_column_idx = headers.index("by_column")
+            elif column_conflicts:
+                raise ValueError("Resolved file wasn't written by a merge by column.")
+            else:
+                # Files written before conflicts were marked
+                conflict_rid_idx = None
+            for row, (parent_rid, conflict) in zip(reader, conflicts.items(), strict=True):
+                if conflict_rid_idx is not None:
+                    by_column = int(parent_rid in column_conflicts)
+                    if (int(row[conflict_rid_idx]) != parent_rid
+                            or int(row[by_column_idx]) != by_column):
+                        raise ValueError(f"Resolved file doesn't match conflict {parent_rid}.")
                 (head_rid, _), (version_rid, _) = conflict
                 if head_rid is not None:
                     if int(row[select_head_idx]) == 1:
@@ -282,17 +629,79 @@ class VersionData():
                         delete_rids.append(version_rid)
         return keep_rids, delete_rids
 
-    def from_file(self, operation, filepath):
-        if operation == "insert":
-            data = parse_csv_data(filepath)
-            self.insert(data)
-        elif operation == "delete":
-            data = parse_csv_data(filepath)
-            self.delete(data)
-        elif operation == "update":
-            old_data = parse_csv_data(filepath[0])
-            new_data = parse_csv_data(filepath[1])
-            self.update(old_data, new_data)
+    def from_file(self, operation, filepath, chunk_size=CSV_CHUNK_SIZE, bulk_load=False):
+        # The file is read and applied `chunk_size` rows at a time, so memory
+        # doesn't grow with the file
+        if operation == "insert" and bulk_load and self._load_data(filepath):
+            return
+        if operation == "update":
+            # Check the files pair up before changing any row
+            num_old = sum(1 for _ in iter_csv_data(filepath[0]))
+            num_new = sum(1 for _ in iter_csv_data(filepath[1]))
+            if num_old != num_new:
+                print(f"OLD_DATA has {num_old} rows but NEW_DATA has {num_new} rows. "
+                      f"No rows are updated.")
+                sys.exit()
+            # Ask about duplicated entries once for the whole file, before
+            # any chunk is applied
+            num_matched = sum(len(rids) for chunk in iter_chunks(iter_csv_data(filepath[0]),
+                                                                 chunk_size)
+                              for rids in self._match_rows(chunk))
+            if num_matched != num_old:
+                self._confirm_update()
+            rows = zip(iter_csv_data(filepath[0]), iter_csv_data(filepath[1]))
+        else:
+            rows = iter_csv_data(filepath)
+        num_rows = 0
+        for chunk in iter_chunks(rows, chunk_size):
+            if operation == "insert":
+                self.insert(chunk)
+            elif operation == "delete":
+                self.delete(chunk)
+            elif operation == "update":
+                self.update([old for old, _ in chunk], [new for _, new in chunk],
+                            confirm=False)
+            num_rows += len(chunk)
+            print(f"Processed {num_rows} rows.")
+
+    def _load_data(self, filepath):
+        # Insert the file with MySQL's bulk loader. The file is rewritten
+        # with a row number that gives each row its rid. Return False if the
+        # server doesn't allow local files.
+        if not self.cnx.local_infile_enabled():
+            print("`local_infile` is disabled on the server. Insert in chunks instead.")
+            return False
+        cols = list(self.table_structure.keys())
+        cols.remove("rid")
+        num_rows = 0
+        # The connection may only load files from the temporary directory
+        fd, load_path = tempfile.mkstemp(suffix=".csv", dir=tempfile.gettempdir())
+        load_path = Path(load_path)
+        try:
+            with open(fd, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                for row in iter_csv_data(filepath):
+                    num_rows += 1
+                    writer.writerow([num_rows] + row)
+            if num_rows == 0:
+                return True
+            max_rid = self._reserve_rids(num_rows)
+            stmt = (f"LOAD DATA LOCAL INFILE '{load_path.as_posix()}' "
+                    f"INTO TABLE {self.table_name}{self.head_suffix} "
+                    f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                    f"LINES TERMINATED BY '\\n' "
+                    f"(@row, {', '.join(cols)}) SET rid = {max_rid} + @row")
+            try:
+                self.cnx.execute(stmt)
+            except MySQLError as e:
+                print(f"{e.msg} Insert in chunks instead.")
+                return False
+            self.cnx.commit()
+            self.operation.insert(RidRanges([(max_rid + 1, max_rid + num_rows)]))
+            print(f"Loaded {num_rows} rows.")
+            return True
+        finally:
+            load_path.unlink(missing_ok=True)
 
     def from_parsed_data(self, operation, attrs):
         if operation == "insert":
@@ -306,10 +715,11 @@ class VersionData():
     def insert(self, data):
         if len(data) == 0:
             return
-        max_rid = self._get_max_rid()
+        max_rid = self._reserve_rids(len(data))
         arg_stmt = self._arg_stmt(self.table_structure, with_rid=True)
         data = self.add_rid(data, max_rid)
-        stmt = f"INSERT INTO {self.table_name}{self.head_suffix} VALUES {arg_stmt}"
+        stmt = (f"INSERT INTO {self.table_name}{self.head_suffix} "
+                f"({self._rid_last_cols()}) VALUES {arg_stmt}")
         self.cnx.executemany(stmt, data)
         self.cnx.commit()
         self.operation.insert(list(range(max_rid + 1,
@@ -317,11 +727,17 @@ class VersionData():
 
     @staticmethod
     def add_rid(data, max_rid):
-        for row in data:
-            max_rid += 1
-            row.insert(0, max_rid)
+        # rid is appended so that the row isn't shifted
+        for rid, row in enumerate(data, max_rid + 1):
+            row.append(rid)
         return data
 
+    def _rid_last_cols(self):
+        # Column list matching the rows of `add_rid`
+        cols = list(self.table_structure.keys())
+        cols.remove("rid")
+        return ", ".join(cols + ["rid"])
+
     @staticmethod
     def _arg_stmt(table_structure, with_rid=True):
         length = len(table_structure) if with_rid else len(table_structure) - 1
@@ -331,50 +747,73 @@ class VersionData():
     def delete(self, data, update=False):
         if len(data) == 0:
             return
-        cols = list(self.table_structure.keys())
-        cols.remove("rid")
-        data_stmt = tuple(tuple(each) for each in data)
-        delete_rids = []
-        total_rids = []
-        for idx, each_stmt in enumerate(data_stmt):
-            stmt = (f"SELECT rid FROM {self.table_name}{self.head_suffix} "
-                    f"WHERE ({', '.join(cols)}) = {each_stmt}")
-            result = self.cnx.execute(stmt)
-            rids = [each[0] for each in result]
-            delete_rids.append(rids)
-            total_rids.extend(rids)
+        delete_rids = self._match_rows(data)
+        total_rids = [rid for rids in delete_rids for rid in rids]
 
         # Behavior of `Update`
         # Duplicated entries will be completely removed but new entries will be added uniquely.
         if update:
             if len(data) != len(total_rids):
-                print(
-                    "Duplicated entries detected. After `UPDATE`, new entries will be unique but not duplicated."
-                )
-                ans = input("Proceed to update? (y/n)\n")
-                if ans != "y":
-                    print("Operation cancelled.")
-                    sys.exit()
+                self._confirm_update()
 
+        # The matched rids are exactly the rows to delete
         stmt = (f"DELETE FROM {self.table_name}{self.head_suffix} "
-                f"WHERE ({', '.join(cols)}) IN {data_stmt}")
+                f"WHERE {self.cnx.rid_condition(total_rids)}")
         self.cnx.execute(stmt)
+        self.cnx.drop_staged()
         self.cnx.commit()
         self.operation.delete(total_rids)
         return delete_rids
 
+    def _match_rows(self, data):
+        # Rids of the head rows equal to each row of `data`. The rows are
+        # staged into a temporary table and matched with one join, where
+        # `<=>` also matches NULL columns.
+        cols = list(self.table_structure.keys())
+        cols.remove("rid")
+        head_table = f"{self.table_name}{self.head_suffix}"
+        stage_table = f"{self.table_name}{MATCH_STAGE_SUFFIX}"
+        self.cnx.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage_table}")
+        self.cnx.execute(f"CREATE TEMPORARY TABLE {stage_table} "
+                         f"SELECT rid AS idx, {', '.join(cols)} FROM {head_table} LIMIT 0")
+        arg_stmt = self._arg_stmt(self.table_structure, with_rid=True)
+        stmt = f"INSERT INTO {stage_table} VALUES {arg_stmt}"
+        rows = [[idx] + list(row) for idx, row in enumerate(data)]
+        for start in range(0, len(rows), STAGE_BATCH_SIZE):
+            self.cnx.executemany(stmt, rows[start:start + STAGE_BATCH_SIZE])
+        match_stmt = " AND ".join(f"h.{col} <=> s.{col}" for col in cols)
+        result = self.cnx.execute(f"SELECT s.idx, h.rid FROM {stage_table} AS s "
+                                  f"JOIN {head_table} AS h ON {match_stmt} "
+                                  f"ORDER BY s.idx, h.rid")
+        self.cnx.execute(f"DROP TEMPORARY TABLE {stage_table}")
+        delete_rids = [[] for _ in data]
+        for idx, rid in result:
+            delete_rids[idx].append(rid)
+        return delete_rids
+
     def select_by_rid(self, rid):
         if not rid:
             return []
         if isinstance(rid, int):
-            stmt = (f"SELECT * FROM {self.table_name}{self.data_table_suffix} "
+            stmt = (f"SELECT * FROM {self.version_graph.version_table.data_table} "
                     f"WHERE rid = {rid}")
         elif isinstance(rid, list):
-            stmt = (f"SELECT * FROM {self.table_name}{self.data_table_suffix} "
-                    f"WHERE rid IN {tuple(rid)}")
+            stmt = (f"SELECT * FROM {self.version_graph.version_table.data_table} "
+                    f"WHERE {self.cnx.rid_condition(rid)}")
         result = self.cnx.execute(stmt)
+        self.cnx.drop_staged()
         return [each[1:] for each in result]
 
+    def _select_rows_by_rid(self, rids):
+        # {rid: row without rid} for `rids` in one query
+        if not rids:
+            return {}
+        stmt = (f"SELECT * FROM {self.version_graph.version_table.data_table} "
+                f"WHERE {self.cnx.rid_condition(rids)}")
+        result = self.cnx.execute(stmt)
+        self.cnx.drop_staged()
+        return {each[0]: each[1:] for each in result}
+
     def delete_from_sql(self, where, return_data=False):
         # TODO: split where stmt if not = but IN
         # TODO: rids should be a double layered list as in delete
@@ -394,21 +833,55 @@ class VersionData():
         else:
             return rids
 
-    def update(self, old_data, new_data):
+    @staticmethod
+    def _confirm_update():
+        print(
+            "Duplicated entries detected. After `UPDATE`, new entries will be unique but not duplicated."
+        )
+        ans = input("Proceed to update? (y/n)\n")
+        if ans != "y":
+            print("Operation cancelled.")
+            sys.exit()
+
+    def update(self, old_data, new_data, confirm=True):
+        # `confirm=False` skips asking about duplicated entries, for callers
+        # that already asked
         if len(old_data) != len(new_data) or len(old_data) == 0:
             return
-        delete_rids = self.delete(old_data, update=True)
+        delete_rids = self.delete(old_data, update=confirm)
         self.insert(new_data)
         insert_rids = self._get_insert_rids()
         self.operation.update(delete_rids, insert_rids)
 
     def update_from_sql(self, where, set):
-        delete_rids, data = self.delete_from_sql(where, return_data=True)
-        data = [list(row) for row in data]
-        data = self._update_data(data, set)
-        self.insert(data)
-        insert_rids = self._get_insert_rids()
-        self.operation.update(delete_rids, insert_rids)
+        # The matched rows are copied to new rids inside MySQL with the SET
+        # expressions applied, so no row data leaves the server
+        head_table = f"{self.table_name}{self.head_suffix}"
+        cols = list(self.table_structure.keys())
+        cols.remove("rid")
+        where = where.strip().rstrip(";")
+        result = self.cnx.execute(f"SELECT rid FROM {head_table} {where} ORDER BY rid")
+        delete_rids = [each[0] for each in result]
+        if not delete_rids:
+            return
+        max_rid = self._reserve_rids(len(delete_rids))
+        insert_rids = list(range(max_rid + 1, max_rid + 1 + len(delete_rids)))
+
+        rid_condition = self.cnx.rid_condition(delete_rids)
+        set = {col.lower(): value for col, value in set.items()}
+        set_stmt = ", ".join(set.get(col.lower(), col) for col in cols)
+        stmt = (f"INSERT INTO {head_table} (rid, {', '.join(cols)}) "
+                f"SELECT {max_rid} + ROW_NUMBER() OVER (ORDER BY rid), {set_stmt} "
+                f"FROM {head_table} WHERE {rid_condition}")
+        self.cnx.execute(stmt)
+        stmt = f"DELETE FROM {head_table} WHERE {rid_condition}"
+        self.cnx.execute(stmt)
+        self.cnx.drop_staged()
+        self.cnx.commit()
+
+        self.operation.delete(delete_rids)
+        self.operation.insert(insert_rids)
+        self.operation.update([[rid] for rid in delete_rids], insert_rids)
 
     def _get_insert_rids(self):
         assert self.operation.stmts[-1][0] == "insert", self.operation.stmts
@@ -416,42 +889,29 @@ class VersionData():
         insert_rids = list(range(start, start + num))
         return insert_rids
 
-    def _update_data(self, data, set: dict):
-        cols = list(self.table_structure.keys())
-        cols.remove("rid")
-        for idx, col in enumerate(cols):
-            value = set.get(col)
-            if value is None:
-                continue
-            else:
-                for row in data:
-                    row[idx] = value
-        return data
-
     def commit(self, **commit_info):
         self.operation.parse()
         cols = list(self.table_structure.keys())
         cols.remove("rid")
-        add_rids = tuple(rid for rid in self.operation.add_rids)
-        remove_rids = tuple(rid for rid in self.operation.remove_rids)
+        add_rids = self.operation.add_rids
+        remove_rids = self.operation.remove_rids
 
         if not (add_rids or remove_rids):
             print("No revision to the last version. Abort commit.")
             return
 
+        where_stmt = None
         if add_rids:
-            stmt = (f"INSERT INTO {self.table_name}{self.data_table_suffix} "
-                    f"SELECT * FROM {self.table_name}{self.head_suffix} ")
-            if len(add_rids) == 1:
-                add_rid = add_rids[0]
-                where_stmt = f"WHERE rid = {add_rid}"
-            elif len(add_rids) > 1:
-                where_stmt = f"WHERE rid IN {add_rids}"
-            stmt += where_stmt
-
+            where_stmt = f"WHERE {self.cnx.rid_condition(add_rids)}"
+            stmt = (f"INSERT INTO {self.version_graph.version_table.data_table} "
+                    f"SELECT * FROM {self.table_name}{self.head_suffix} {where_stmt}")
             self.cnx.execute(stmt)
             self.cnx.commit()
+        old_head = self.version_graph.head
         self.version_graph.add_version(self.operation, **commit_info)
+        self.partitions.add_version(self.version_graph.head, old_head,
+                                    f"{self.table_name}{self.head_suffix}", where_stmt)
+        self.cnx.drop_staged()
         self._save_log(**commit_info)
 
         print(f"Create version {self.get_current_version()}")
@@ -464,8 +924,10 @@ class VersionData():
             self.cnx.execute(f"ALTER TABLE {self.table_name} DROP COLUMN rid")
         else:
             self.cnx.execute(f"DROP TABLE {self.table_name}{self.head_suffix}")
-        self.cnx.execute(
-            f"DROP TABLE {self.table_name}{self.data_table_suffix}")
+        self.cnx.execute(f"DROP TABLE {self.version_graph.version_table.data_table}")
+        self.cnx.execute(f"DROP TABLE IF EXISTS {self.table_name}{SEQUENCE_SUFFIX}")
+        self.partitions.remove()
+        self.diff_cache.remove()
         self.version_graph.remove()
         self.operation.remove()
         self._remove_log()
@@ -516,8 +978,30 @@ class VersionData():
     def get_current_version(self):
         return self.version_graph.head
 
+    def _create_rid_sequence(self):
+        sequence_table = f"{self.table_name}{SEQUENCE_SUFFIX}"
+        stmt = (f"CREATE TABLE IF NOT EXISTS {sequence_table} "
+                f"(id TINYINT PRIMARY KEY, last_rid BIGINT UNSIGNED)")
+        self.cnx.execute(stmt)
+
+    def _reserve_rids(self, num):
+        # Reserve `num` consecutive rids and return the rid before them. The
+        # row lock of the sequence keeps concurrent writers from reserving
+        # the same rids, and LAST_INSERT_ID reads back this session's value.
+        sequence_table = f"{self.table_name}{SEQUENCE_SUFFIX}"
+        stmt = (f"UPDATE {sequence_table} "
+                f"SET last_rid = LAST_INSERT_ID(last_rid + {int(num)}) WHERE id = 1")
+        self.cnx.execute(stmt)
+        if self.cnx.cursor.rowcount == 0:
+            # Start after the rids of tables created before the sequence
+            self.cnx.execute(f"INSERT IGNORE INTO {sequence_table} VALUES (1, {self._get_max_rid()})")
+            self.cnx.execute(stmt)
+        result = self.cnx.execute("SELECT LAST_INSERT_ID()")
+        self.cnx.commit()
+        return int(result[0][0]) - num
+
     def _get_max_rid(self):
-        stmt = f"SELECT MAX(rid) FROM {self.table_name}{self.data_table_suffix}"
+        stmt = f"SELECT MAX(rid) FROM {self.version_graph.version_table.data_table}"
         result_1 = self.cnx.execute(stmt)
         stmt = f"SELECT MAX(rid) FROM {self.table_name}{self.head_suffix}"
         result_2 = self.cnx.execute(stmt)
@@ -544,7 +1028,7 @@ class VersionData():
 
     def _get_table_types(self, table_name=None):
         if table_name is None:
-            table_name = self.table_name + self.data_table_suffix
+            table_name = self.version_graph.version_table.data_table
         schema = self.cnx.execute(f"SHOW COLUMNS FROM `{table_name}`")
         type_dict = parse_table_types(schema)
         return type_dict
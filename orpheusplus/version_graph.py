@@ -2,8 +2,9 @@ import pickle
 import networkx as nx
 
 from orpheusplus import VERSIONGRAPH_DIR
+from orpheusplus.ancestry import AncestryIndex
 from orpheusplus.operation import Operation
-from orpheusplus.version_table import VersionTable
+from orpheusplus.version_table import DEFAULT_STORAGE, get_version_table
 from orpheusplus.mysql_manager import MySQLManager
 
 class VersionGraph():
@@ -16,8 +17,10 @@ class VersionGraph():
         self.G = None
         self.head = None
         self.version_count = None
+        self.storage = None
+        self.ancestry = None
 
-    def init_version_graph(self, db_name, table_name):
+    def init_version_graph(self, db_name, table_name, storage=DEFAULT_STORAGE):
         self.table_name = table_name
         self.db_name = db_name
         self.version_graph_path = VERSIONGRAPH_DIR / f"{db_name}/{table_name}"
@@ -27,7 +30,9 @@ class VersionGraph():
 
         self.head = 0
         self.version_count = 0
+        self.storage = storage
         self.G = nx.DiGraph()
+        self.ancestry = AncestryIndex()
         self._save_graph()
         print("Version graph created successfully.")
         print(f"Save to: {self.version_graph_path}")
@@ -36,7 +41,7 @@ class VersionGraph():
         self._init_version_table()
     
     def _init_version_table(self):
-        self.version_table = VersionTable(self.cnx)
+        self.version_table = get_version_table(self.cnx, self.table_name, self.storage)
         self.version_table.init_version_table(self.table_name)
 
     def load_version_graph(self, db_name, table_name):
@@ -56,8 +61,6 @@ class VersionGraph():
         self.head = version
         self._save_graph()
         self._load_version_table()
-        rids = self.version_table.get_version_rids(version)
-        return rids
 
     def _save_graph(self):
         self._save_graph_attr() 
@@ -66,14 +69,29 @@ class VersionGraph():
 
     def _save_graph_attr(self):
         self.G.graph["version_count"] = self.version_count        
+        self.G.graph["storage"] = self.storage
+        self.G.graph["ancestry"] = self.ancestry
 
     def _load_graph_attr(self):
         self.head = Operation.get_user_head(self.db_name, self.table_name, self.cnx.cnx_args["user"])
         self.version_count = self.G.graph["version_count"]    
+        # Graphs saved before storage models existed use the rlist layout
+        self.storage = self.G.graph.get("storage", "rlist")
+        # Build the index for graphs saved before it existed
+        self.ancestry = self.G.graph.get("ancestry")
+        if self.ancestry is None or len(self.ancestry) != self.G.number_of_nodes():
+            self.ancestry = AncestryIndex.build(self.G)
 
     def _load_version_table(self):
-        self.version_table = VersionTable(self.cnx)
-        self.version_table.load_version_table(self.table_name)
+        self.version_table = get_version_table(self.cnx, self.table_name, self.storage)
+
+    @staticmethod
+    def get_storage(db_name, table_name):
+        try:
+            with open(VERSIONGRAPH_DIR / f"{db_name}/{table_name}", "rb") as f:
+                return pickle.load(f).graph.get("storage", "rlist")
+        except FileNotFoundError:
+            return "rlist"
 
     def add_version(self, operation: Operation, **commit_info):
         num_rids, overlap = self._get_num_rids_and_overlap(self.head, operation)
@@ -86,6 +104,9 @@ class VersionGraph():
         self.G.add_node(self.head, num_rids=num_rids)
         if self.G.has_node(old_head):
             self.G.add_edge(old_head, self.head, overlap=overlap)
+            self.ancestry.add_version(self.head, [old_head])
+        else:
+            self.ancestry.add_version(self.head)
 
         self.version_table.add_version(operation=operation,
                                        version=self.head,
@@ -98,6 +119,7 @@ class VersionGraph():
                       from_version, to_version, **commit_info):
         _, overlap = self._get_num_rids_and_overlap(from_version, operation)
         self.G.add_edge(from_version, to_version, overlap=overlap)
+        self.ancestry.add_edge(from_version, to_version)
         operation.commit(to_version, **commit_info)    
         self._save_graph()
 
@@ -115,8 +137,36 @@ class VersionGraph():
         
         return total_rids, overlap
 
-    def gather_changes(self, version):
-        path_1, path_2 = self._find_path_to_common_ancestor(self.head, version)
+    def get_num_rids(self, version):
+        try:
+            return self.G.nodes[version]["num_rids"]
+        except KeyError:
+            return 0
+
+    def estimate_delta(self, version_1, version_2):
+        # Upper bound of the rows that differ between two versions, summed
+        # from the `num_rids`/`overlap` weights along the path between them.
+        try:
+            path = nx.shortest_path(self.G.to_undirected(as_view=True),
+                                    version_1, version_2)
+        except (nx.NodeNotFound, nx.NetworkXNoPath):
+            return None
+
+        delta = 0
+        for node_1, node_2 in zip(path, path[1:]):
+            if self.G.has_edge(node_1, node_2):
+                overlap = self.G.edges[node_1, node_2]["overlap"]
+            else:
+                overlap = self.G.edges[node_2, node_1]["overlap"]
+            delta += (self.get_num_rids(node_1) + self.get_num_rids(node_2) -
+                      2 * overlap)
+        return delta
+
+    def gather_changes(self, version, base=None):
+        # Changes from the common ancestor to `base` (head by default) and
+        # to `version`
+        base = self.head if base is None else base
+        path_1, path_2 = self._find_path_to_common_ancestor(base, version)
         stmts_1 = self._gather_changes_from_path(path_1)
         stmts_2 = self._gather_changes_from_path(path_2)
         changes_head = Operation._merge_changes(stmts_1)
@@ -139,10 +189,19 @@ class VersionGraph():
         return changes
 
     def _find_path_to_common_ancestor(self, version_1, version_2):
-        ancestor = nx.lowest_common_ancestor(self.G, version_1, version_2)
-        path_1 = nx.shortest_path(self.G, ancestor, version_1)
-        path_2 = nx.shortest_path(self.G, ancestor, version_2)
+        ancestor = self.get_common_ancestor(version_1, version_2)
+        path_1 = self.ancestry.path(self.G, ancestor, version_1)
+        path_2 = self.ancestry.path(self.G, ancestor, version_2)
         return path_1, path_2
+
+    def get_common_ancestor(self, version_1, version_2):
+        return self.ancestry.lowest_common_ancestor(version_1, version_2)
+
+    def get_ancestors(self, version):
+        return self.ancestry.ancestors(version)
+
+    def get_descendants(self, version):
+        return self.ancestry.descendants(version)
     
     def remove(self):
         self.version_table.delete()
@@ -1,37 +1,140 @@
+from abc import ABC, abstractmethod
+
+from orpheusplus import ORPHEUSPLUS_CONFIG
+from orpheusplus.bitmap import RidBitmap
+from orpheusplus.intervals import (RidRanges, from_intervals, subtract_intervals,
+                                   to_intervals, union_intervals)
 from orpheusplus.mysql_manager import MySQLManager
 from orpheusplus.operation import Operation
 
 
+DATA_TABLE_SUFFIX = "_orpheusplus"
 VERSION_TABLE_SUFFIX = "_orpheusplus_version" 
+VERSION_CHAIN_SUFFIX = "_orpheusplus_version_chain"
+REMOVED_RIDS_SUFFIX = "_orpheusplus_removed"
+EXCLUDED_RIDS_SUFFIX = "_orpheusplus_excluded"
+DEFAULT_CHECKPOINT_INTERVAL = 10
+DEFAULT_STORAGE = "rlist"
 
-class VersionTable():
+class StorageModel(ABC):
+    # How the versions of a table map to the rows of its data table (rid as
+    # the key). Every model keeps the membership in its own version table(s)
+    # and exposes it as an SQL condition on rids through `rid_filter`.
     version_table_suffix = VERSION_TABLE_SUFFIX
-    
+    storage = None
+
     def __init__(self, cnx: MySQLManager):
         self.cnx = cnx
         self.table_name = None
+        self.data_table = None
 
+    @abstractmethod
     def init_version_table(self, table_name):
+        pass
+
+    def load_version_table(self, table_name):
         self.table_name = table_name
+        self.data_table = f"{table_name}{DATA_TABLE_SUFFIX}"
+
+    @abstractmethod
+    def add_version(self, operation: Operation, version, parent):
+        pass
+
+    @abstractmethod
+    def get_version_rids(self, version):
+        pass
+
+    @abstractmethod
+    def rid_filter(self, version, column="rid"):
+        # SQL condition that holds for the rows of `version`
+        pass
+
+    @abstractmethod
+    def _version_rids_stmt(self, version):
+        # SELECT statement of the rids in `version`
+        pass
+
+    def diff_rids(self, version_1, version_2):
+        # Anti-joins on the version table, fetched as ranges without
+        # touching the data table
+        def select(version, other):
+            rid_stmt = (f"SELECT a.rid FROM ({self._version_rids_stmt(version)}) AS a "
+                        f"WHERE NOT ({self.rid_filter(other, 'a.rid')})")
+            return self.cnx.fetch_rid_ranges(rid_stmt)
+        return select(version_1, version_2), select(version_2, version_1)
+
+    def diff_rows_stmt(self, version_1, version_2, excluded=None):
+        # Rows of `version_1` that are not in `version_2`, skipping the rows
+        # matching the `excluded` condition on `d.rid`
+        excluded_stmt = f"AND NOT ({excluded}) " if excluded is not None else ""
+        return (f"SELECT d.* FROM {self.data_table} AS d "
+                f"WHERE {self.rid_filter(version_1, 'd.rid')} "
+                f"AND NOT ({self.rid_filter(version_2, 'd.rid')}) {excluded_stmt}ORDER BY d.rid")
+
+    def merge_rids(self, version_1, version_2, excluded_rids, diff=None):
+        # The merged version keeps the rows of both versions except
+        # `excluded_rids`. Return the (add, remove) rids from each version.
+        # The sets are computed in MySQL and fetched as ranges. A cached
+        # `diff` of the versions gives the added rids without a query.
+        excluded_table = self.cnx.stage_rids(f"{self.table_name}{EXCLUDED_RIDS_SUFFIX}",
+                                             excluded_rids)
+        excluded = f"d.rid IN (SELECT rid FROM {excluded_table})"
+
+        def select(condition):
+            rid_stmt = f"SELECT d.rid FROM {self.data_table} AS d WHERE {condition}"
+            return self.cnx.fetch_rid_ranges(rid_stmt)
+
+        in_1 = self.rid_filter(version_1, "d.rid")
+        in_2 = self.rid_filter(version_2, "d.rid")
+        if diff is None:
+            add_1 = select(f"{in_2} AND NOT ({in_1}) AND NOT ({excluded})")
+            add_2 = select(f"{in_1} AND NOT ({in_2}) AND NOT ({excluded})")
+        else:
+            excluded_intervals = to_intervals(excluded_rids)
+            add_1 = RidRanges(subtract_intervals(diff[1].intervals, excluded_intervals))
+            add_2 = RidRanges(subtract_intervals(diff[0].intervals, excluded_intervals))
+        changes = ((add_1, select(f"{in_1} AND {excluded}")),
+                   (add_2, select(f"{in_2} AND {excluded}")))
+        self.cnx.drop_staged(excluded_table)
+        return changes
+
+    def delete(self):
+        self.cnx.execute(f"DROP TABLE {self.table_name}{self.version_table_suffix}")
+
+    def _stage_removed_rids(self, operation: Operation):
+        return self.cnx.stage_rids(f"{self.table_name}{REMOVED_RIDS_SUFFIX}",
+                                   operation.remove_rids)
+
+
+class VersionTable(StorageModel):
+    # Split-by-rlist: one (version, rid) row for every rid in every version
+    storage = "rlist"
+
+    def init_version_table(self, table_name):
+        self.load_version_table(table_name)
         cols = "version INT UNSIGNED, rid INT UNSIGNED, PRIMARY KEY (version, rid)" 
         stmt = f"CREATE TABLE {table_name}{self.version_table_suffix} ({cols})"
         self.cnx.execute(stmt)
 
-    def load_version_table(self, table_name):
-        self.table_name = table_name
-
     def add_version(self, operation: Operation, version, parent):
         # MySQL doesn't support array
-        # Insert relations as multiple new rows
-        rids = set(self.get_version_rids(parent))
-        for rid in operation.add_rids:
-            rids.add(rid)
-        for rid in operation.remove_rids:
-            rids.remove(rid)
-        rids = sorted(list(rids))
-        values = [(version, rid) for rid in rids]
-        stmt = f"INSERT INTO {self.table_name}{self.version_table_suffix} VALUES (%s, %s)" 
-        self.cnx.executemany(stmt, values)
+        # Copy the rows of the parent except the removed rids, then insert
+        # the added rids. Only the changes are sent to MySQL.
+        version_table = f"{self.table_name}{self.version_table_suffix}"
+        stmt = (f"INSERT INTO {version_table} (version, rid) "
+                f"SELECT {int(version)}, p.rid FROM {version_table} AS p ")
+        if operation.remove_rids:
+            removed_table = self._stage_removed_rids(operation)
+            stmt += (f"LEFT JOIN {removed_table} AS r ON r.rid = p.rid "
+                     f"WHERE p.version = {int(parent)} AND r.rid IS NULL")
+        else:
+            stmt += f"WHERE p.version = {int(parent)}"
+        self.cnx.execute(stmt)
+        if operation.add_rids:
+            values = [(version, rid) for rid in operation.add_rids]
+            stmt = f"INSERT INTO {version_table} VALUES (%s, %s)" 
+            self.cnx.executemany(stmt, values)
+        self.cnx.drop_staged(f"{self.table_name}{REMOVED_RIDS_SUFFIX}")
         self.cnx.commit()
 
     def get_version_rids(self, version):
@@ -42,5 +145,267 @@ class VersionTable():
         except:
             return [] 
     
+    def rid_filter(self, version, column="rid"):
+        return f"{column} IN ({self._version_rids_stmt(version)})"
+
+    def _version_rids_stmt(self, version):
+        return (f"SELECT rid FROM {self.table_name}{self.version_table_suffix} "
+                f"WHERE version = {int(version)}")
+
+
+class VlistVersionTable(StorageModel):
+    # Split-by-vlist: one (rid, versions) row for every rid with a JSON
+    # array of the versions containing it. A commit touches only the rows of
+    # its parent instead of copying them into new rows.
+    storage = "vlist"
+
+    def init_version_table(self, table_name):
+        self.load_version_table(table_name)
+        cols = ("rid INT UNSIGNED PRIMARY KEY, versions JSON, "
+                "INDEX versions_idx ((CAST(versions AS UNSIGNED ARRAY)))")
+        stmt = f"CREATE TABLE {table_name}{self.version_table_suffix} ({cols})"
+        self.cnx.execute(stmt)
+
+    def add_version(self, operation: Operation, version, parent):
+        version_table = f"{self.table_name}{self.version_table_suffix}"
+        stmt = (f"UPDATE {version_table} SET versions = JSON_ARRAY_APPEND(versions, '$', {int(version)}) "
+                f"WHERE {int(parent)} MEMBER OF (versions)")
+        self.cnx.execute(stmt)
+        # Removed rids got `version` appended last above
+        if operation.remove_rids:
+            stmt = f"UPDATE {version_table} SET versions = JSON_REMOVE(versions, '$[last]') WHERE rid = %s"
+            self.cnx.executemany(stmt, [(rid, ) for rid in operation.remove_rids])
+        if operation.add_rids:
+            stmt = (f"INSERT INTO {version_table} VALUES (%s, JSON_ARRAY({int(version)})) "
+                    f"ON DUPLICATE KEY UPDATE versions = JSON_ARRAY_APPEND(versions, '$', {int(version)})")
+            self.cnx.executemany(stmt, [(rid, ) for rid in operation.add_rids])
+        self.cnx.commit()
+
+    def get_version_rids(self, version):
+        try:
+            stmt = (f"SELECT rid FROM {self.table_name}{self.version_table_suffix} "
+                    f"WHERE {int(version)} MEMBER OF (versions) ORDER BY rid")
+            result = self.cnx.execute(stmt)
+            return [r[0] for r in result]
+        except:
+            return []
+
+    def rid_filter(self, version, column="rid"):
+        return f"{column} IN ({self._version_rids_stmt(version)})"
+
+    def _version_rids_stmt(self, version):
+        return (f"SELECT rid FROM {self.table_name}{self.version_table_suffix} "
+                f"WHERE {int(version)} MEMBER OF (versions)")
+
+
+class IntervalVersionTable(StorageModel):
+    # One (version, start_rid, end_rid) row for every run of consecutive rids
+    storage = "interval"
+
+    def init_version_table(self, table_name):
+        self.load_version_table(table_name)
+        cols = ("version INT UNSIGNED, start_rid INT UNSIGNED, end_rid INT UNSIGNED, "
+                "PRIMARY KEY (version, start_rid)")
+        stmt = f"CREATE TABLE {table_name}{self.version_table_suffix} ({cols})"
+        self.cnx.execute(stmt)
+
+    def add_version(self, operation: Operation, version, parent):
+        intervals = self.get_version_intervals(parent)
+        intervals = union_intervals(intervals, to_intervals(operation.add_rids))
+        intervals = subtract_intervals(intervals, to_intervals(operation.remove_rids))
+        values = [(version, start, end) for start, end in intervals]
+        if values:
+            stmt = f"INSERT INTO {self.table_name}{self.version_table_suffix} VALUES (%s, %s, %s)"
+            self.cnx.executemany(stmt, values)
+            self.cnx.commit()
+
+    def get_version_intervals(self, version):
+        try:
+            stmt = (f"SELECT start_rid, end_rid FROM {self.table_name}{self.version_table_suffix} "
+                    f"WHERE version = {version} ORDER BY start_rid")
+            result = self.cnx.execute(stmt)
+            return [(r[0], r[1]) for r in result]
+        except:
+            return []
+
+    def get_version_rids(self, version):
+        return list(from_intervals(self.get_version_intervals(version)))
+
+    def rid_filter(self, version, column="rid"):
+        return (f"EXISTS (SELECT 1 FROM {self.table_name}{self.version_table_suffix} AS v "
+                f"WHERE v.version = {int(version)} AND {column} BETWEEN v.start_rid AND v.end_rid)")
+
+    def _version_rids_stmt(self, version):
+        # The version table only holds the bounds, so the rids are read
+        # from the data table
+        return f"SELECT rid FROM {self.data_table} WHERE {self.rid_filter(version)}"
+
+    def diff_rids(self, version_1, version_2):
+        # Subtracted in Python from the intervals of both versions
+        intervals_1 = self.get_version_intervals(version_1)
+        intervals_2 = self.get_version_intervals(version_2)
+        return (RidRanges(subtract_intervals(intervals_1, intervals_2)),
+                RidRanges(subtract_intervals(intervals_2, intervals_1)))
+
+
+class DeltaVersionTable(StorageModel):
+    # Checkpoint versions store all their rids with sign 1. Other versions
+    # store only their changes: 1 for added and -1 for removed rids.
+    # Summing the signs along the chain back to a checkpoint leaves 1 for
+    # the rids in a version and 0 for the others.
+    storage = "delta"
+    version_chain_suffix = VERSION_CHAIN_SUFFIX
+
+    def init_version_table(self, table_name):
+        self.load_version_table(table_name)
+        cols = "version INT UNSIGNED, rid INT UNSIGNED, sign TINYINT, PRIMARY KEY (version, rid)"
+        stmt = f"CREATE TABLE {table_name}{self.version_table_suffix} ({cols})"
+        self.cnx.execute(stmt)
+        # depth: number of deltas since the last checkpoint (0 for a checkpoint)
+        cols = "version INT UNSIGNED PRIMARY KEY, parent INT UNSIGNED, depth INT UNSIGNED"
+        stmt = f"CREATE TABLE {table_name}{self.version_chain_suffix} ({cols})"
+        self.cnx.execute(stmt)
+
+    def add_version(self, operation: Operation, version, parent):
+        depth = self._get_depth(parent)
+        version_table = f"{self.table_name}{self.version_table_suffix}"
+        if depth is None or depth + 1 >= self._get_checkpoint_interval():
+            # The checkpoint is built from the parent rows inside MySQL
+            if depth is not None:
+                stmt = (f"INSERT INTO {version_table} "
+                        f"SELECT {int(version)}, p.rid, 1 FROM ({self._version_rids_stmt(parent)}) AS p ")
+                if operation.remove_rids:
+                    removed_table = self._stage_removed_rids(operation)
+                    stmt += f"LEFT JOIN {removed_table} AS r ON r.rid = p.rid WHERE r.rid IS NULL"
+                self.cnx.execute(stmt)
+                self.cnx.drop_staged(f"{self.table_name}{REMOVED_RIDS_SUFFIX}")
+            depth = 0
+            values = [(version, rid, 1) for rid in operation.add_rids]
+        else:
+            depth += 1
+            values = ([(version, rid, 1) for rid in operation.add_rids] +
+                      [(version, rid, -1) for rid in operation.remove_rids])
+        if values:
+            stmt = f"INSERT INTO {version_table} VALUES (%s, %s, %s)"
+            self.cnx.executemany(stmt, values)
+        stmt = (f"INSERT INTO {self.table_name}{self.version_chain_suffix} "
+                f"VALUES ({int(version)}, {int(parent)}, {depth})")
+        self.cnx.execute(stmt)
+        self.cnx.commit()
+
+    def get_version_rids(self, version):
+        try:
+            result = self.cnx.execute(self._version_rids_stmt(version))
+            return [r[0] for r in result]
+        except:
+            return []
+
+    def rid_filter(self, version, column="rid"):
+        return f"{column} IN ({self._version_rids_stmt(version)})"
+
     def delete(self):
-        self.cnx.execute(f"DROP TABLE {self.table_name}{self.version_table_suffix}")
\ No newline at end of file
+        super().delete()
+        self.cnx.execute(f"DROP TABLE {self.table_name}{self.version_chain_suffix}")
+
+    def _version_rids_stmt(self, version):
+        return (f"SELECT rid FROM {self.table_name}{self.version_table_suffix} "
+                f"WHERE version IN ({self._chain_stmt(version)}) "
+                f"GROUP BY rid HAVING SUM(sign) > 0")
+
+    def _chain_stmt(self, version):
+        # Versions from `version` back to its checkpoint
+        chain_table = f"{self.table_name}{self.version_chain_suffix}"
+        return (f"WITH RECURSIVE delta_chain AS ("
+                f"SELECT version, parent, depth FROM {chain_table} WHERE version = {int(version)} "
+                f"UNION ALL "
+                f"SELECT c.version, c.parent, c.depth FROM {chain_table} AS c "
+                f"JOIN delta_chain ON c.version = delta_chain.parent WHERE delta_chain.depth > 0) "
+                f"SELECT version FROM delta_chain")
+
+    def _get_depth(self, version):
+        stmt = (f"SELECT depth FROM {self.table_name}{self.version_chain_suffix} "
+                f"WHERE version = {int(version)}")
+        result = self.cnx.execute(stmt)
+        return result[0][0] if result else None
+
+    def _get_checkpoint_interval(self):
+        # config.yaml:
+        # checkpoint_interval:
+        #   default: 10
+        #   table_name: 50
+        intervals = ORPHEUSPLUS_CONFIG.get("checkpoint_interval") or {}
+        return int(intervals.get(self.table_name,
+                                 intervals.get("default", DEFAULT_CHECKPOINT_INTERVAL)))
+
+
+class BitmapVersionTable(StorageModel):
+    # One (version, bitmap) row per version with the rids as a compressed bitmap
+    storage = "bitmap"
+
+    def __init__(self, cnx: MySQLManager):
+        super().__init__(cnx)
+        self._staged_versions = set()
+
+    def init_version_table(self, table_name):
+        self.load_version_table(table_name)
+        cols = "version INT UNSIGNED PRIMARY KEY, bitmap LONGBLOB"
+        stmt = f"CREATE TABLE {table_name}{self.version_table_suffix} ({cols})"
+        self.cnx.execute(stmt)
+
+    def add_version(self, operation: Operation, version, parent):
+        bitmap = self.get_version_bitmap(parent)
+        bitmap = bitmap | RidBitmap.from_intervals(operation.add_rids.intervals)
+        bitmap = bitmap - RidBitmap.from_intervals(operation.remove_rids.intervals)
+        stmt = f"INSERT INTO {self.table_name}{self.version_table_suffix} VALUES (%s, %s)"
+        self.cnx.execute(stmt, (version, bitmap.to_bytes()))
+        self.cnx.commit()
+
+    def get_version_bitmap(self, version):
+        stmt = (f"SELECT bitmap FROM {self.table_name}{self.version_table_suffix} "
+                f"WHERE version = {int(version)}")
+        result = self.cnx.execute(stmt)
+        return RidBitmap.from_bytes(result[0][0]) if result else RidBitmap()
+
+    def get_version_rids(self, version):
+        return list(self.get_version_bitmap(version))
+
+    def rid_filter(self, version, column="rid"):
+        return f"{column} IN ({self._version_rids_stmt(version)})"
+
+    def _version_rids_stmt(self, version):
+        # MySQL can't read the bitmap, so the rids are staged into a
+        # temporary table of the current session.
+        stage_table = f"{self.table_name}_orpheusplus_bitmap_{int(version)}"
+        if version not in self._staged_versions:
+            self.cnx.stage_rids(stage_table, self.get_version_bitmap(version))
+            self._staged_versions.add(version)
+        return f"SELECT rid FROM {stage_table}"
+
+    def diff_rids(self, version_1, version_2):
+        # Subtracted in Python from the bitmaps of both versions
+        bitmap_1 = self.get_version_bitmap(version_1)
+        bitmap_2 = self.get_version_bitmap(version_2)
+        return (RidRanges((bitmap_1 - bitmap_2).intervals()),
+                RidRanges((bitmap_2 - bitmap_1).intervals()))
+
+    def merge_rids(self, version_1, version_2, excluded_rids, diff=None):
+        bitmap_1 = self.get_version_bitmap(version_1)
+        bitmap_2 = self.get_version_bitmap(version_2)
+        total = (bitmap_1 | bitmap_2) - RidBitmap.from_rids(excluded_rids)
+        return ((list(total - bitmap_1), list(bitmap_1 - total)),
+                (list(total - bitmap_2), list(bitmap_2 - total)))
+
+
+STORAGE_MODELS = {
+    VersionTable.storage: VersionTable,
+    VlistVersionTable.storage: VlistVersionTable,
+    IntervalVersionTable.storage: IntervalVersionTable,
+    DeltaVersionTable.storage: DeltaVersionTable,
+    BitmapVersionTable.storage: BitmapVersionTable,
+}
+
+
+def get_version_table(cnx: MySQLManager, table_name, storage=DEFAULT_STORAGE):
+    version_table = STORAGE_MODELS[storage](cnx)
+    version_table.load_version_table(table_name)
+    return version_table
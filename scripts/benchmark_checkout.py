@@ -0,0 +1,70 @@
+import argparse
+import time
+from datetime import datetime
+
+from orpheusplus.connection import connect_table
+
+TABLE_NAME = "_benchmark_checkout"
+SCHEMA_PATH = "./examples/sample_schema.csv"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare per-rid and set-based checkout")
+    parser.add_argument("--rows", type=int, default=100000, help="rows in version 1")
+    parser.add_argument("--batch", type=int, default=10000, help="rows per insert batch")
+    return parser.parse_args()
+
+
+def setup_table(rows, batch):
+    table = connect_table()
+    table.init_table(TABLE_NAME, SCHEMA_PATH)
+    for start in range(0, rows, batch):
+        data = [[idx, idx % 60, idx * 10] for idx in range(start, min(start + batch, rows))]
+        table.insert(data)
+    table.commit(msg="version_1", now=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    # An empty version to switch away from
+    table.delete_from_sql("")
+    table.commit(msg="version_2", now=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return table
+
+
+def checkout_per_rid(table, version):
+    # The previous implementation: one statement per rid
+    rids = table.version_graph.version_table.get_version_rids(version)
+    table.cnx.execute(f"DELETE FROM {table.table_name}{table.head_suffix}")
+    stmt = (f"INSERT INTO {table.table_name}{table.head_suffix} "
+            f"SELECT * FROM {table.table_name}{table.data_table_suffix} "
+            f"WHERE rid = %s")
+    table.cnx.executemany(stmt, [(rid, ) for rid in rids])
+    table.cnx.commit()
+
+
+def checkout_set_based(table, version):
+    table._materialize_head(version)
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    table = setup_table(args.rows, args.batch)
+    try:
+        results = {}
+        for name, func in [("per-rid", checkout_per_rid), ("set-based", checkout_set_based)]:
+            func(table, 2)
+            results[name] = timeit(func, table, 1)
+            count = table.cnx.execute(f"SELECT COUNT(*) FROM {table.table_name}{table.head_suffix}")[0][0]
+            assert count == args.rows, f"{name}: {count} rows in head, expected {args.rows}"
+        for name, elapsed in results.items():
+            print(f"{name:<10} {elapsed:8.3f} s")
+        print(f"speedup    {results['per-rid'] / results['set-based']:8.1f}x")
+    finally:
+        table.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import time
+from datetime import datetime
+
+from orpheusplus.operation import Operation
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time merge change resolution on chained updates")
+    parser.add_argument("--rows", type=int, default=100, help="rows updated on each branch")
+    parser.add_argument("--updates", type=int, default=10000,
+                        help="chained updates per branch, spread over the rows")
+    parser.add_argument("--naive", action="store_true",
+                        help="also time the per-rid chain walk used before")
+    return parser.parse_args()
+
+
+def build_branch(rows, updates, next_rid):
+    # Every update deletes the current rid of a row and inserts a new one
+    stmts = []
+    current = list(range(1, rows + 1))
+    now = datetime.now()
+    for idx in range(updates):
+        row = idx % rows
+        delete_stmt = ("delete", (current[row], 1), now)
+        insert_stmt = ("insert", (next_rid, 1), now)
+        stmts.append(("update", ([delete_stmt], [insert_stmt], {current[row]: next_rid}), now))
+        current[row] = next_rid
+        next_rid += 1
+    return stmts, next_rid
+
+
+def naive_solve_changes(history):
+    change = {}
+    for parent_rid, value in history.items():
+        next_state = value
+        while next_state[0] in history:
+            next_state = history[next_state[0]]
+        change[parent_rid] = next_state
+    return change
+
+
+def main():
+    args = parse_args()
+    stmts_1, next_rid = build_branch(args.rows, args.updates, args.rows + 1)
+    stmts_2, _ = build_branch(args.rows, args.updates, next_rid)
+
+    start = time.perf_counter()
+    changes_1 = Operation._merge_changes(stmts_1)
+    changes_2 = Operation._merge_changes(stmts_2)
+    conflicts = Operation._find_conflicts(changes_1, changes_2)
+    elapsed = time.perf_counter() - start
+    print(f"{args.updates} updates per branch, {len(conflicts)} conflicts")
+    print(f"path-compressed: {elapsed:.3f} s")
+
+    if args.naive:
+        start = time.perf_counter()
+        for stmts in [stmts_1, stmts_2]:
+            naive_solve_changes(Operation._construct_history(stmts))
+        print(f"naive: {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
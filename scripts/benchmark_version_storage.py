@@ -0,0 +1,66 @@
+import argparse
+import random
+import time
+from datetime import datetime
+
+from orpheusplus.connection import connect_table
+
+TABLE_NAME = "_benchmark_storage"
+SCHEMA_PATH = "./examples/sample_schema.csv"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare version table storage models")
+    parser.add_argument("--versions", type=int, default=1000)
+    parser.add_argument("--inserts", type=int, default=100, help="rows inserted per version")
+    parser.add_argument("--deletes", type=int, default=20,
+                        help="rows deleted every `--delete_every` versions")
+    parser.add_argument("--delete_every", type=int, default=10)
+    parser.add_argument("--storage", nargs="+", default=["rlist", "interval"])
+    return parser.parse_args()
+
+
+def run_history(storage, args):
+    # Append-mostly history with occasional scattered deletes
+    rng = random.Random(0)
+    table = connect_table()
+    table.init_table(f"{TABLE_NAME}_{storage}", SCHEMA_PATH, storage=storage)
+    live_ids = []
+    next_id = 0
+    commit_time = 0
+    try:
+        for version in range(1, args.versions + 1):
+            data = [[idx, idx % 60, idx * 10] for idx in range(next_id, next_id + args.inserts)]
+            live_ids.extend(range(next_id, next_id + args.inserts))
+            next_id += args.inserts
+            table.insert(data)
+            if version % args.delete_every == 0:
+                removed = rng.sample(live_ids, args.deletes)
+                removed_set = set(removed)
+                live_ids = [idx for idx in live_ids if idx not in removed_set]
+                table.delete_from_sql(f"WHERE employee_id IN ({', '.join(map(str, removed))})")
+            start = time.perf_counter()
+            table.commit(msg=f"version_{version}", now=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            commit_time += time.perf_counter() - start
+
+        version_table = f"{table.table_name}{table.version_graph.version_table.version_table_suffix}"
+        table.cnx.execute(f"ANALYZE TABLE {version_table}")
+        rows = table.cnx.execute(f"SELECT COUNT(*) FROM {version_table}")[0][0]
+        size = table.cnx.execute(
+            f"SELECT data_length + index_length FROM information_schema.TABLES "
+            f"WHERE table_schema = '{table.db_name}' AND table_name = '{version_table}'")[0][0]
+        return {"rows": rows, "bytes": size, "commit_time": commit_time}
+    finally:
+        table.remove()
+
+
+def main():
+    args = parse_args()
+    results = {storage: run_history(storage, args) for storage in args.storage}
+    print(f"{'storage':<10} {'rows':>12} {'bytes':>14} {'commit (s)':>12}")
+    for storage, result in results.items():
+        print(f"{storage:<10} {result['rows']:>12} {result['bytes']:>14} {result['commit_time']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
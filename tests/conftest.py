@@ -10,8 +10,10 @@ from orpheusplus.mysql_manager import MySQLManager
 from orpheusplus.user_manager import UserManager
 from orpheusplus.version_data import DATA_TABLE_SUFFIX
 from orpheusplus.version_data import HEAD_SUFFIX as head_suffix
+from orpheusplus.version_data import SEQUENCE_SUFFIX
 from orpheusplus.version_data import VersionData
-from orpheusplus.version_table import VERSION_TABLE_SUFFIX
+from orpheusplus import ORPHEUSPLUS_CONFIG
+from orpheusplus.version_table import VERSION_TABLE_SUFFIX, VERSION_CHAIN_SUFFIX
 
 TEST_TABLE_NAME = "_test_table"
 
@@ -54,6 +56,9 @@ def _drop_table_if_exists(cnx):
     cnx.execute(f"DROP TABLE IF EXISTS {TEST_TABLE_NAME}{HEAD_SUFFIX}")
     cnx.execute(
         f"DROP TABLE IF EXISTS {TEST_TABLE_NAME}{VERSION_TABLE_SUFFIX}")
+    cnx.execute(
+        f"DROP TABLE IF EXISTS {TEST_TABLE_NAME}{VERSION_CHAIN_SUFFIX}")
+    cnx.execute(f"DROP TABLE IF EXISTS {TEST_TABLE_NAME}{SEQUENCE_SUFFIX}")
 
 
 @pytest.fixture(scope="function")
@@ -82,6 +87,26 @@ def table_with_data(cnx):
     version_data.remove()
 
 
+@pytest.fixture(scope="function", params=["vlist", "interval", "delta", "bitmap"])
+def table_with_storage(cnx, request):
+    _drop_table_if_exists(cnx)
+    # Force checkpoints and deltas within a short history
+    ORPHEUSPLUS_CONFIG["checkpoint_interval"] = {TEST_TABLE_NAME: 2}
+    version_data = VersionData(cnx)
+    version_data.init_table(TEST_TABLE_NAME, "./tests/test_data/sample_schema.csv",
+                            storage=request.param)
+    now = datetime.now()
+    version_data.from_file("insert", "./tests/test_data/data_1.csv")
+    version_data.commit(msg="version_1", now=now)
+    version_data.from_file("insert", "./tests/test_data/data_2.csv")
+    version_data.commit(msg="version_2", now=now)
+    version_data.from_file("delete", "./tests/test_data/data_2.csv")
+    version_data.commit(msg="version_3", now=now)
+    yield version_data
+    version_data.remove()
+    del ORPHEUSPLUS_CONFIG["checkpoint_interval"]
+
+
 @pytest.fixture(scope="function")
 def table_for_merge(cnx):
     _drop_table_if_exists(cnx)
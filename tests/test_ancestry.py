@@ -0,0 +1,49 @@
+import networkx as nx
+
+from orpheusplus.ancestry import AncestryIndex
+
+
+def _graph():
+    #     /- 2 -\
+    # 1 -+       +- 5
+    #     \- 3 -/
+    #         \- 4
+    G = nx.DiGraph([(1, 2), (1, 3), (3, 4), (3, 5), (2, 5)])
+    return G
+
+
+def test_lowest_common_ancestor():
+    index = AncestryIndex.build(_graph())
+    assert index.lowest_common_ancestor(2, 4) == 1
+    assert index.lowest_common_ancestor(4, 5) == 3
+    assert index.lowest_common_ancestor(2, 5) == 2
+    assert index.lowest_common_ancestor(5, 5) == 5
+
+
+def test_ancestors_and_descendants():
+    index = AncestryIndex.build(_graph())
+    result = (index.ancestors(5), index.descendants(3), index.descendants(5))
+    expected = ([1, 2, 3], [4, 5], [])
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert index.is_ancestor(2, 5) and not index.is_ancestor(2, 4)
+
+
+def test_incremental_index():
+    G = _graph()
+    index = AncestryIndex()
+    index.add_version(1)
+    index.add_version(2, [1])
+    index.add_version(3, [1])
+    index.add_version(4, [3])
+    index.add_version(5, [3])
+    index.add_edge(2, 5)
+    assert index.masks == AncestryIndex.build(G).masks
+
+
+def test_path():
+    G = _graph()
+    index = AncestryIndex.build(G)
+    assert index.path(G, 1, 4) == [1, 3, 4]
+    assert index.path(G, 2, 5) == [2, 5]
+    assert index.path(G, 1, 5) in ([1, 2, 5], [1, 3, 5])
+    assert index.path(G, 4, 4) == [4]
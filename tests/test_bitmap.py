@@ -0,0 +1,53 @@
+import time
+
+from orpheusplus.bitmap import RidBitmap
+
+
+def test_from_rids():
+    bitmap = RidBitmap.from_rids([5, 1, 2, 3, 9])
+    result = list(bitmap)
+    expected = [1, 2, 3, 5, 9]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert len(bitmap) == 5
+    assert 9 in bitmap and 4 not in bitmap
+    assert not RidBitmap.from_rids([])
+
+
+def test_intervals():
+    bitmap = RidBitmap.from_intervals([(1, 3), (5, 5), (100, 200)])
+    result = bitmap.intervals()
+    expected = [(1, 3), (5, 5), (100, 200)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert bitmap == RidBitmap.from_rids([1, 2, 3, 5] + list(range(100, 201)))
+
+    # Bytes shared by several intervals
+    bitmap = RidBitmap.from_intervals([(0, 0), (2, 3), (6, 9), (15, 16), (17, 17)])
+    assert bitmap == RidBitmap.from_rids([0, 2, 3, 6, 7, 8, 9, 15, 16, 17])
+
+
+def test_from_intervals_scale():
+    # One interval per other rid up to 2 million rids
+    intervals = [(rid, rid) for rid in range(0, 2000000, 2)]
+    start = time.perf_counter()
+    bitmap = RidBitmap.from_intervals(intervals)
+    elapsed = time.perf_counter() - start
+    assert len(bitmap) == len(intervals)
+    assert 1999998 in bitmap and 1999999 not in bitmap
+    assert elapsed < 5, f"elapsed: {elapsed:.2f}s"
+
+
+def test_set_operations():
+    bitmap_1 = RidBitmap.from_rids([1, 2, 3, 4])
+    bitmap_2 = RidBitmap.from_rids([3, 4, 5])
+    assert list(bitmap_1 | bitmap_2) == [1, 2, 3, 4, 5]
+    assert list(bitmap_1 & bitmap_2) == [3, 4]
+    assert list(bitmap_1 - bitmap_2) == [1, 2]
+    assert list(bitmap_2 - bitmap_1) == [5]
+
+
+def test_serialization():
+    bitmap = RidBitmap.from_intervals([(1, 100000), (200000, 200010)])
+    blob = bitmap.to_bytes()
+    assert len(blob) < 1000
+    assert RidBitmap.from_bytes(blob) == bitmap
+    assert RidBitmap.from_bytes(RidBitmap().to_bytes()) == RidBitmap()
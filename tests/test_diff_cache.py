@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from orpheusplus import diff_cache as diff_cache_module
+from orpheusplus.diff_cache import DiffCache
+from orpheusplus.intervals import RidRanges
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(diff_cache_module, "DIFFCACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def test_get_put(cache_dir):
+    cache = DiffCache("db", "table")
+    assert cache.get(1, 2) is None
+    cache.put(2, 1, [5, 6, 7], RidRanges([(1, 3)]))
+    result = cache.get(2, 1)
+    expected = (RidRanges([(5, 7)]), RidRanges([(1, 3)]))
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    result = cache.get(1, 2)
+    assert result == expected[::-1], f"result: {result}\nexpected: {expected[::-1]}"
+
+    cache.remove()
+    assert cache.get(1, 2) is None
+
+
+def test_evict(cache_dir):
+    cache = DiffCache("db", "table")
+    for version in range(2, 5):
+        cache.put(1, version, [version], [])
+        path = cache_dir / "db/table" / f"1_{version}"
+        os.utime(path, (version, version))
+    size = (cache_dir / "db/table/1_2").stat().st_size
+    # Reading 1_2 makes 1_3 the least recently used
+    cache.get(1, 2)
+    cache.evict(max_size=2 * size)
+    result = sorted(path.name for path in (cache_dir / "db/table").iterdir())
+    expected = ["1_2", "1_4"]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
@@ -0,0 +1,61 @@
+from orpheusplus.intervals import *
+
+
+def test_to_intervals():
+    result = to_intervals([7, 1, 2, 3, 5, 6, 3])
+    expected = [(1, 3), (5, 7)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert to_intervals([]) == []
+
+
+def test_from_intervals():
+    result = list(from_intervals([(1, 3), (5, 5)]))
+    expected = [1, 2, 3, 5]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert count_intervals([(1, 3), (5, 5)]) == 4
+
+
+def test_union_intervals():
+    result = union_intervals([(1, 3), (10, 12)], [(4, 5), (8, 11), (20, 20)])
+    expected = [(1, 5), (8, 12), (20, 20)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_subtract_intervals():
+    result = subtract_intervals([(1, 10), (15, 20)], [(0, 1), (4, 5), (10, 16), (20, 30)])
+    expected = [(2, 3), (6, 9), (17, 19)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert subtract_intervals([(1, 5)], []) == [(1, 5)]
+    assert subtract_intervals([(1, 5)], [(1, 5)]) == []
+
+
+def test_rid_counter():
+    counter = RidCounter()
+    # Insert 1-10, delete 4-6, insert 5 again
+    counter.add(1, 10)
+    counter.add(4, 3, weight=-1)
+    counter.add(5, 1)
+    result = counter.intervals()
+    expected = [(1, 3), (5, 5), (7, 10)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    counter.add(20, 2, weight=-1)
+    result = counter.intervals(positive=False)
+    expected = [(20, 21)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_rid_ranges():
+    rids = RidRanges.from_rids([3, 1, 2, 7])
+    assert rids.intervals == [(1, 3), (7, 7)]
+    assert list(rids) == [1, 2, 3, 7]
+    assert len(rids) == 4
+    assert rids == [1, 2, 3, 7]
+    assert to_intervals(rids) == [(1, 3), (7, 7)]
+    assert not RidRanges()
+
+
+def test_rid_ranges_contains():
+    rids = RidRanges([(1, 3), (7, 7)])
+    result = [rid for rid in range(0, 9) if rid in rids]
+    expected = [1, 2, 3, 7]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
@@ -33,3 +33,23 @@ def test_c_mysql_table_not_exist(capfd):
     result = e.value.msg.replace(f"{user.info['database']}.", "").strip()
     expected = "Table `table_not_exist` doesn't exist."
     assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_c_rid_condition():
+    from orpheusplus.mysql_manager import MAX_RANGE_PREDICATES, STAGED_RIDS_TABLE
+
+    user = UserManager()
+    mydb = MySQLManager(**user.info)
+    result = mydb.rid_condition([5, 1, 2, 3])
+    expected = "(rid BETWEEN 1 AND 3 OR rid = 5)"
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert mydb.rid_condition([]) == "FALSE"
+
+    rids = list(range(1, 4 * MAX_RANGE_PREDICATES, 2))
+    # Repeated rids are staged once
+    result = mydb.rid_condition(rids + rids[:3], column="d.rid")
+    expected = f"d.rid IN (SELECT rid FROM {STAGED_RIDS_TABLE})"
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    result = mydb.execute(f"SELECT COUNT(*) FROM {STAGED_RIDS_TABLE}")[0][0]
+    assert result == len(rids), f"result: {result}\nexpected: {len(rids)}"
+    mydb.drop_staged()
@@ -0,0 +1,158 @@
+import pytest
+
+from orpheusplus import operation as operation_module
+from orpheusplus.operation import JOURNAL_SUFFIX, Operation
+
+
+@pytest.fixture
+def operation_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(operation_module, "OPERATION_DIR", tmp_path)
+    return tmp_path
+
+
+def _load(user="user"):
+    op = Operation()
+    op.load_operation("db", "table", user)
+    return op
+
+
+def test_journal_replay(operation_dir):
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    op.insert([1, 2, 3])
+    # Update rid 3 to rid 4
+    op.delete([3])
+    op.insert([4])
+    op.update([[3]], [4])
+    assert (operation_dir / "db/table" / f"0_user{JOURNAL_SUFFIX}").is_file()
+
+    loaded = _load()
+    assert loaded.stmts == op.stmts, f"result: {loaded.stmts}\nexpected: {op.stmts}"
+
+    loaded.parse()
+    loaded = _load()
+    result = (loaded.add_rids, loaded.remove_rids, loaded.stmts)
+    expected = ([1, 2, 4], [], [])
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    assert len(loaded.history) == 2
+
+
+def test_journal_compaction(operation_dir, monkeypatch):
+    monkeypatch.setattr(operation_module, "JOURNAL_COMPACT_RECORDS", 5)
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    for rid in range(1, 13):
+        op.insert([rid])
+    assert op.journal_records == 2
+    loaded = _load()
+    result = [stmt[1] for stmt in loaded.stmts]
+    expected = [(rid, 1) for rid in range(1, 13)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_journal_cut_off_record(operation_dir):
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    op.insert([1])
+    op.insert([2])
+    journal_path = operation_dir / "db/table" / f"0_user{JOURNAL_SUFFIX}"
+    journal = journal_path.read_bytes()
+    journal_path.write_bytes(journal[:-3])
+
+    loaded = _load()
+    assert [stmt[1] for stmt in loaded.stmts] == [(1, 1)]
+    loaded.insert([3])
+    loaded = _load()
+    result = [stmt[1] for stmt in loaded.stmts]
+    expected = [(1, 1), (3, 1)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_switch_user_version_head(operation_dir):
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    op.insert([1])
+    op.switch_user_version_head(2)
+    assert Operation.get_user_head("db", "table", "user") == 2
+    assert sorted(path.name for path in (operation_dir / "db/table").iterdir()) == ["2_user"]
+    assert [stmt[1] for stmt in _load().stmts] == [(1, 1)]
+
+
+def test_parse_multiset(operation_dir):
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    op.insert(list(range(1, 2000001)))
+    op.delete(list(range(100, 201)))
+    op.insert([150])
+    op.delete([2000001])
+    assert not op.is_empty()
+    op.parse()
+    result = (op.add_rids.intervals, op.remove_rids.intervals)
+    expected = ([(1, 99), (150, 150), (201, 2000000)], [(2000001, 2000001)])
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_commit_segments(operation_dir):
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    for version in [1, 2]:
+        op.insert([version])
+        op.parse()
+        op.commit(version, msg=f"version_{version}", now="now")
+    assert op.history == []
+
+    parent = Operation()
+    parent.load_operation("db", "table", 1)
+    result = parent.get_commit_change(2)
+    expected = [("insert", (2, 1)), ("commit", (2, "version_2"))]
+    assert [stmt[:2] for stmt in result] == expected, f"result: {result}\nexpected: {expected}"
+
+    # Merging version 1 into version 3 keeps its other segments
+    parent.insert([3])
+    parent.parse()
+    parent.commit(3, msg="merge", now="now")
+    parent = Operation()
+    parent.load_operation("db", "table", 1)
+    assert sorted(parent.segments) == [2, 3]
+    assert parent.history == []
+    with pytest.raises(Exception):
+        parent.get_commit_change(4)
+
+
+def test_split_history():
+    history = [("insert", (1, 1), 0), ("commit", (2, "a"), 0),
+               ("delete", (1, 1), 0), ("commit", (3, "b"), 0),
+               ("insert", (2, 1), 0)]
+    segments, pending = Operation._split_history(history)
+    assert segments == {2: history[:2], 3: history[2:4]}
+    assert pending == history[4:]
+
+
+def test_update_scattered_rids(operation_dir):
+    op = Operation()
+    op.init_operation("db", "table", 0, "user")
+    op.insert([1, 2, 3, 4, 5])
+    # Update rids 1 and 3 to rids 6 and 7
+    op.delete([1, 3])
+    op.insert([6, 7])
+    op.update([[1], [3]], [6, 7])
+    assert len(op.stmts) == 2
+    op.parse()
+    result = (op.add_rids, op.remove_rids)
+    expected = ([2, 4, 5, 6, 7], [])
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    result = Operation._merge_changes(op.history)
+    expected = {1: (6, op.history[1][2]), 3: (7, op.history[1][2])}
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_solve_changes_chain():
+    # 1 -> 2 -> ... -> 10000 -> deleted, 20000 -> 20001
+    history = {rid: (rid + 1, rid) for rid in range(1, 10000)}
+    history[10000] = (None, 10000)
+    history[20000] = (20001, 0)
+    result = Operation._solve_changes(history)
+    assert list(result) == list(history)
+    assert result[1] == (None, 10000) and result[9999] == (None, 10000)
+    assert result[20000] == (20001, 0)
@@ -0,0 +1,94 @@
+import networkx as nx
+
+from orpheusplus.partition import estimate_records, lyresplit
+
+
+def _graph():
+    # 2: +10 rows from version 1, 3: 100 new rows replacing all rows of 2
+    G = nx.DiGraph()
+    G.add_node(1, num_rids=100)
+    G.add_node(2, num_rids=110)
+    G.add_node(3, num_rids=100)
+    G.add_edge(1, 2, overlap=100)
+    G.add_edge(2, 3, overlap=0)
+    return G
+
+
+def test_estimate_records():
+    G = _graph()
+    result = estimate_records(G, [1, 2, 3])
+    expected = 210
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    result = estimate_records(G, [3])
+    expected = 100
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_lyresplit():
+    G = _graph()
+    result = lyresplit(G, delta=0.5)
+    expected = [[1, 2], [3]]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    result = lyresplit(G, delta=0.1)
+    expected = [[1, 2, 3]]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    result = lyresplit(G, delta=1)
+    expected = [[1], [2], [3]]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    assert lyresplit(nx.DiGraph()) == []
+
+
+def test_lyresplit_merge():
+    # Merged version 4 stays with the parent it shares most rows with
+    G = _graph()
+    G.add_node(4, num_rids=105)
+    G.add_edge(3, 4, overlap=100)
+    G.add_edge(1, 4, overlap=5)
+    result = lyresplit(G, delta=0.5)
+    expected = [[1, 2], [3, 4]]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_c_repartition(func, table_with_data, expected_data):
+    expected = {1: expected_data["data_1"],
+                2: expected_data["data_1"] + expected_data["data_2"],
+                3: expected_data["data_1"]}
+    partitions = table_with_data.partitions.repartition(delta=1)
+    assert len(partitions) > 1, partitions
+    for version in [1, 2, 3]:
+        table_with_data.checkout(version)
+        func.check_head()
+        result = func.read_result()
+        assert result == expected_data["headers"] + expected[version], f"result: {result}\nexpected: {expected[version]}"
+
+    # New versions are added to the partition of their parent
+    table_with_data.from_file("insert", "./tests/test_data/data_2.csv")
+    table_with_data.commit(msg="version_4", now="2024-01-01 00:00:00")
+    assert table_with_data.partitions.get_table(4) == table_with_data.partitions.get_table(3)
+    table_with_data.checkout(1)
+    table_with_data.checkout(4)
+    func.check_head()
+    result = func.read_result()
+    assert result == expected_data["headers"] + expected[2], f"result: {result}\nexpected: {expected[2]}"
+
+
+def test_c_add_version_new_partition(func, table_with_data, expected_data):
+    table_with_data.partitions.repartition(delta=1)
+    # A parent without a partition, e.g. added while partitions were rebuilt
+    table_with_data.version_graph.G.nodes[3].pop("partition")
+    table_with_data.from_file("insert", "./tests/test_data/data_2.csv")
+    table_with_data.commit(msg="version_4", now="2024-01-01 00:00:00")
+    # The new partition holds every row of version 4, not only the new rows
+    partition_table = table_with_data.partitions.get_table(4)
+    result = table_with_data.cnx.execute(f"SELECT COUNT(*) FROM {partition_table}")[0][0]
+    expected = 6
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    table_with_data.checkout(1)
+    table_with_data.checkout(4)
+    func.check_head()
+    result = func.read_result()
+    expected = expected_data["headers"] + expected_data["data_1"] + expected_data["data_2"]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
@@ -29,4 +29,11 @@ def test_reorder_data():
     order = [2, 1, 0]
     result = reorder_data(data, order)
     expected = [[3, 2, 1], ["foobar", "bar", "foo"]]
-    assert result == expected, f"result: {result}\nexpected: {expected}"
\ No newline at end of file
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_iter_chunks():
+    result = list(iter_chunks(iter_csv_data("./examples/data_1.csv"), 2))
+    expected = [[['101', '30', '10340'], ['102', '18', '4000']],
+                [['103', '40', '20500']]]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
@@ -2,6 +2,11 @@ from datetime import datetime
 
 import pytest
 
+from orpheusplus.intervals import RidRanges
+from orpheusplus.mysql_manager import MySQLManager
+from orpheusplus.user_manager import UserManager
+from orpheusplus.version_data import SEQUENCE_SUFFIX, VersionData
+
 
 @pytest.fixture(scope="session")
 def data_path():
@@ -43,6 +48,22 @@ def test_c_insert(func, data_path, table, expected_data):
     assert data == expected, f"result: {data}\nexpected: {expected}"
 
 
+def test_c_insert_bulk(func, data_path, table, expected_data, capsys):
+    if not table.cnx.local_infile_enabled():
+        pytest.skip("`local_infile` is disabled on the server")
+    table.from_file("insert", data_path['1'], bulk_load=True)
+    out = capsys.readouterr().out.strip()
+    expected = "Loaded 3 rows."
+    assert out == expected, f"result: {out}\nexpected: {expected}"
+    func.check_head()
+    data = func.read_result()
+    expected = expected_data["headers"] + expected_data["data_1"]
+    assert data == expected, f"result: {data}\nexpected: {expected}"
+    result = [stmt[1] for stmt in table.operation.stmts]
+    expected = [(1, 3)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
 def test_c_insert_delete(func, data_path, table, expected_data):
     table.from_file("insert", data_path['1'])
     table.from_file("delete", data_path['1'])
@@ -60,6 +81,55 @@ def test_c_insert_update(func, data_path, table, expected_data):
     assert data == expected, f"result: {data}\nexpected: {expected}"
 
 
+def test_c_update_duplicates(func, data_path, table, expected_data, monkeypatch):
+    table.from_file("insert", data_path['1'])
+    table.from_file("insert", data_path['1'])
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or "n")
+    with pytest.raises(SystemExit):
+        table.from_file("update", [data_path['1'], data_path['2']], chunk_size=1)
+    # Asked once, before any chunk is updated
+    assert len(prompts) == 1, f"result: {prompts}"
+    func.check_head()
+    data = func.read_result()
+    expected = expected_data["headers"] + expected_data["data_1"] + expected_data["data_1"]
+    assert data == expected, f"result: {data}\nexpected: {expected}"
+
+
+def test_c_reserve_rids(table):
+    # Another session on the same table shares the rid sequence
+    other = VersionData(MySQLManager(**UserManager().info))
+    other.load_table(table.table_name)
+    result = [table._reserve_rids(3), other._reserve_rids(2), table._reserve_rids(1)]
+    expected = [0, 3, 5]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_c_reserve_rids_legacy_table(cnx, data_path, table):
+    table.from_file("insert", data_path['1'])
+    # A table created before the rid sequence
+    cnx.execute(f"DROP TABLE {table.table_name}{SEQUENCE_SUFFIX}")
+    loaded = VersionData(cnx)
+    loaded.load_table(table.table_name)
+    result = loaded._reserve_rids(2)
+    expected = 3
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_c_update_from_sql(func, data_path, table, expected_data):
+    table.from_file("insert", data_path['1'])
+    table.update_from_sql("WHERE age < 35;", {"salary": "salary * 2", "name": "'x y'"})
+    func.check_head()
+    data = func.read_result()
+    expected = expected_data["headers"] + [['103', 'c', '40', '20500'],
+                                           ['101', 'x y', '30', '20680'],
+                                           ['102', 'x y', '18', '8000']]
+    assert data == expected, f"result: {data}\nexpected: {expected}"
+    result = table.operation.stmts[-1][1][2]
+    expected = {1: 4, 2: 5}
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
 def test_c_commit_no_revision_1(table, capfd):
     now = datetime.now()
     table.commit(msg="version_1", now=now)
@@ -97,11 +167,31 @@ def test_c_commit(func, table_with_data, expected_data):
     assert result == expected, f"result: {result}\nexpected: {expected}"
 
 
+def test_c_commit_storage(func, table_with_storage, expected_data):
+    expected = {1: expected_data["data_1"],
+                2: expected_data["data_1"] + expected_data["data_2"],
+                3: expected_data["data_1"]}
+    for version in [1, 2, 3, 2]:
+        func.check_version_table(version)
+        result = func.read_result()
+        assert result == expected_data["headers"] + expected[version], f"result: {result}\nexpected: {expected[version]}"
+
+        table_with_storage.checkout(version)
+        func.check_head()
+        result = func.read_result()
+        assert result == expected_data["headers"] + expected[version], f"result: {result}\nexpected: {expected[version]}"
+
+
 def test_c_merge_1(func, table_for_merge, expected_data):
     table_for_merge.merge(2, resolved_file="./tests/test_data/conflicts_1.csv")
     func.check_version_table(4)
     result = func.read_result()
     assert result == expected_data['merge_1'], f"result: {result}\nexpected: {expected_data['merge_1']}"
+
+    # The head table follows the merged version
+    func.check_head()
+    result = func.read_result()
+    assert result == expected_data['merge_1'], f"result: {result}\nexpected: {expected_data['merge_1']}"
     
 
 def test_c_merge_2(func, table_for_merge, expected_data):
@@ -136,4 +226,106 @@ def test_c_merge_no_conflict(func, larger_table_for_merge, expected_data):
     larger_table_for_merge.merge(2)
     func.check_version_table(7)
     result = func.read_result()
-    assert result == expected_data['no_conflict'], f"result: {result}\nexpected: {expected_data['no_conflict']}"
\ No newline at end of file
+    assert result == expected_data['no_conflict'], f"result: {result}\nexpected: {expected_data['no_conflict']}"
+
+
+def test_parse_keep_or_delete(tmp_path):
+    resolved_file = tmp_path / "resolved.csv"
+    resolved_file.write_text("select_head,id,timestamp,select_2,id,timestamp\n"
+                             "1,a,t,0,b,t\n"
+                             "0,,t,1,c,t\n")
+    # Conflicts are keyed by parent rid, which need not start at 1
+    conflicts = {7: ((10, "t"), (12, "t")),
+                 9: ((None, "t"), (13, "t"))}
+    result = VersionData._parse_keep_or_delete(resolved_file, conflicts, 2)
+    expected = ([10, 13], [12])
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    # A resolved file missing a conflict is rejected
+    resolved_file.write_text("select_head,id,timestamp,select_2,id,timestamp\n"
+                             "1,a,t,0,b,t\n")
+    with pytest.raises(ValueError):
+        VersionData._parse_keep_or_delete(resolved_file, conflicts, 2)
+
+
+def test_parse_keep_or_delete_by_column(tmp_path):
+    resolved_file = tmp_path / "resolved.csv"
+    headers = "select_head,id,timestamp,select_2,id,timestamp,conflict_rid,by_column\n"
+    resolved_file.write_text(headers +
+                             "0,a,t,1,b,t,7,1\n"
+                             "0,,t,1,c,t,9,0\n")
+    conflicts = {7: ((10, "t"), (12, "t")),
+                 9: ((None, "t"), (13, "t"))}
+    column_conflicts = {7: [0, None]}
+    result = VersionData._parse_keep_or_delete(resolved_file, conflicts, 2, column_conflicts)
+    expected = ([12, 13], [10])
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    # The file was written by a merge by row
+    with pytest.raises(ValueError):
+        VersionData._parse_keep_or_delete(resolved_file, conflicts, 2)
+    # The file was written for other conflicts
+    with pytest.raises(ValueError):
+        VersionData._parse_keep_or_delete(resolved_file, {7: conflicts[7], 8: conflicts[9]},
+                                          2, column_conflicts)
+    # A merge by column needs a marked file
+    resolved_file.write_text("select_head,id,timestamp,select_2,id,timestamp\n"
+                             "0,a,t,1,b,t\n"
+                             "0,,t,1,c,t\n")
+    with pytest.raises(ValueError):
+        VersionData._parse_keep_or_delete(resolved_file, conflicts, 2, column_conflicts)
+
+
+def test_merge_columns():
+    ancestor = ("a", "30", "10340")
+    # Head changed age and version changed salary
+    result = VersionData._merge_columns(ancestor, ("a", "31", "10340"), ("a", "30", "9000"))
+    expected = [0, 0, 1]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    # Both changed age the same way
+    result = VersionData._merge_columns(ancestor, ("a", "31", "10340"), ("a", "31", "10340"))
+    expected = [0, 0, 0]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    # Both changed age differently
+    result = VersionData._merge_columns(ancestor, ("a", "31", "10340"), ("a", "32", "9000"))
+    expected = [0, None, 1]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+    # NULL columns hash to None
+    result = VersionData._merge_columns(("a", None), ("a", None), ("b", None))
+    expected = [1, 0]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_pair_updates():
+    # Version 1 updated rid 1 to 5, version 2 updated rid 1 to 7 and rid 2
+    # to 8, and deleted rid 3
+    changes_1 = {1: (5, "t")}
+    changes_2 = {1: (7, "t"), 2: (8, "t"), 3: (None, "t")}
+    rids_1 = RidRanges([(2, 2), (5, 5)])
+    rids_2 = RidRanges([(7, 8)])
+    result = VersionData._pair_updates(changes_1, changes_2, rids_1, rids_2)
+    expected = [(2, 8), (5, 7)]
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    # Version 1 updated rid 1 to 5 and version 2 deleted it
+    result = VersionData._pair_updates({1: (5, "t")}, {1: (None, "t")},
+                                       RidRanges([(5, 5)]), RidRanges([(7, 7)]))
+    assert result == [], f"result: {result}\nexpected: []"
+
+
+def test_pair_updates_after_insert():
+    # Version 2 inserted rid 10 after version 1 and updated it to rid 11
+    result = VersionData._pair_updates({}, {10: (11, "t")}, RidRanges(), RidRanges([(11, 11)]))
+    assert result == [], f"result: {result}\nexpected: []"
+
+
+def test_check_versions():
+    from types import SimpleNamespace
+
+    import networkx as nx
+
+    table = VersionData.__new__(VersionData)
+    G = nx.DiGraph()
+    G.add_edge(1, 2)
+    table.version_graph = SimpleNamespace(G=G)
+    table._check_versions(1, 2)
+    with pytest.raises(SystemExit):
+        table._check_versions(1, 9)
@@ -15,3 +15,21 @@ def test_c_version_graph_attrs(table_with_data):
     head = table_with_data.version_graph.head
     expected = 3
     assert head == expected
+
+
+def test_estimate_delta():
+    import networkx as nx
+
+    from orpheusplus.version_graph import VersionGraph
+
+    graph = VersionGraph(cnx=None)
+    graph.G = nx.DiGraph()
+    graph.G.add_node(1, num_rids=100)
+    graph.G.add_node(2, num_rids=110)
+    graph.G.add_node(3, num_rids=90)
+    # 2: +10 rows, 3: -10 rows from version 1
+    graph.G.add_edge(1, 2, overlap=100)
+    graph.G.add_edge(1, 3, overlap=90)
+    assert graph.estimate_delta(2, 3) == 20
+    assert graph.estimate_delta(3, 3) == 0
+    assert graph.estimate_delta(0, 3) is None
@@ -0,0 +1,47 @@
+import pytest
+
+from orpheusplus.version_table import (DATA_TABLE_SUFFIX, STORAGE_MODELS,
+                                       VERSION_TABLE_SUFFIX, StorageModel,
+                                       get_version_table)
+
+
+def test_rid_filter():
+    result = get_version_table(None, "foo", "rlist").rid_filter(3)
+    expected = f"rid IN (SELECT rid FROM foo{VERSION_TABLE_SUFFIX} WHERE version = 3)"
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    result = get_version_table(None, "foo", "interval").rid_filter(3, "d.rid")
+    expected = (f"EXISTS (SELECT 1 FROM foo{VERSION_TABLE_SUFFIX} AS v "
+                f"WHERE v.version = 3 AND d.rid BETWEEN v.start_rid AND v.end_rid)")
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+    result = get_version_table(None, "foo", "vlist").rid_filter(3)
+    expected = f"rid IN (SELECT rid FROM foo{VERSION_TABLE_SUFFIX} WHERE 3 MEMBER OF (versions))"
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+@pytest.mark.parametrize("storage", list(STORAGE_MODELS))
+def test_storage_model(storage):
+    version_table = get_version_table(None, "foo", storage)
+    assert isinstance(version_table, StorageModel)
+    assert version_table.storage == storage
+    assert version_table.data_table == f"foo{DATA_TABLE_SUFFIX}"
+
+
+def test_diff_rows_stmt():
+    result = get_version_table(None, "foo", "rlist").diff_rows_stmt(1, 2)
+    expected = (f"SELECT d.* FROM foo{DATA_TABLE_SUFFIX} AS d "
+                f"WHERE d.rid IN (SELECT rid FROM foo{VERSION_TABLE_SUFFIX} WHERE version = 1) "
+                f"AND NOT (d.rid IN (SELECT rid FROM foo{VERSION_TABLE_SUFFIX} WHERE version = 2)) "
+                f"ORDER BY d.rid")
+    assert result == expected, f"result: {result}\nexpected: {expected}"
+
+
+def test_storage_model_abstract():
+    with pytest.raises(TypeError):
+        StorageModel(None)
+    result = get_version_table(None, "foo", "interval")._version_rids_stmt(3)
+    expected = (f"SELECT rid FROM foo{DATA_TABLE_SUFFIX} WHERE EXISTS (SELECT 1 FROM "
+                f"foo{VERSION_TABLE_SUFFIX} AS v WHERE v.version = 3 "
+                f"AND rid BETWEEN v.start_rid AND v.end_rid)")
+    assert result == expected, f"result: {result}\nexpected: {expected}"